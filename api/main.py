@@ -1,23 +1,133 @@
-from fastapi import FastAPI
-from pydantic import BaseModel
-from typing import Optional
+import json
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Header, HTTPException
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
+from typing import List, Optional
 
 try:
-    from src.rag_service_local import answer
+    from src.rag_service_local import (
+        answer_async, answer_stream, answer_batch, start_background_load, is_ready, readiness,
+        cache_stats, admission_stats, llm_stats, batcher_stats
+    )
+    from src.admission import Saturated
+    from src import metrics
 except ImportError:
     import sys
     import os
     sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
-    from rag_service_local import answer
+    from rag_service_local import (
+        answer_async, answer_stream, answer_batch, start_background_load, is_ready, readiness,
+        cache_stats, admission_stats, llm_stats, batcher_stats
+    )
+    from admission import Saturated
+    import metrics
 
-app = FastAPI(title="HTU RAG API (Local)")
+try:
+    from src.config import BATCH_MAX_QUESTIONS, METRICS_ENABLED
+except ImportError:
+    from config import BATCH_MAX_QUESTIONS, METRICS_ENABLED
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Bind immediately; models load and warm up in the background
+    start_background_load()
+    yield
+
+app = FastAPI(title="HTU RAG API (Local)", lifespan=lifespan)
+
+@app.exception_handler(Saturated)
+async def saturated(request, exc: Saturated):
+    # Queue full: back off (429). Waited the maximum and still no slot: overloaded (503).
+    return JSONResponse({"detail": str(exc), "reason": exc.reason},
+                        status_code=429 if exc.reason == "queue_full" else 503,
+                        headers={"Retry-After": str(exc.retry_after)})
+
+class SearchParams(BaseModel):
+    # Unset fields use the SEARCH_* config defaults
+    hnsw_ef: Optional[int] = Field(None, ge=1)
+    exact: Optional[bool] = None  # brute force; cheap for small filtered subsets
+    quant_ignore: Optional[bool] = None
+    quant_rescore: Optional[bool] = None
+    quant_oversampling: Optional[float] = Field(None, ge=1.0)
+    score_threshold: Optional[float] = None
+    payload_fields: Optional[List[str]] = None
 
 class AskReq(BaseModel):
     question: str
     top_k: int = 6
     lang: Optional[str] = None  # "en" or "ar"
+    search: Optional[SearchParams] = None
+    debug: bool = False
+    extractive: Optional[bool] = None  # None = EXTRACTIVE_ENABLED
+    deadline_ms: Optional[int] = Field(None, ge=1)  # None = REQUEST_DEADLINE_SECONDS
+
+class AskBatchReq(BaseModel):
+    questions: List[str] = Field(..., min_length=1, max_length=BATCH_MAX_QUESTIONS)
+    top_k: int = 6
+    lang: Optional[str] = None
+
+def _require_ready():
+    if not is_ready():
+        raise HTTPException(status_code=503, detail="Models are still loading", headers={"Retry-After": "5"})
+
+@app.get("/healthz")
+def healthz():
+    return {"status": "ok"}
+
+@app.get("/readyz")
+def readyz():
+    st = readiness()
+    return JSONResponse(st, status_code=200 if st["ready"] else 503)
+
+@app.get("/stats")
+def stats():
+    return {"llm_admission": admission_stats(), "llm": llm_stats(), "caches": cache_stats(),
+            "batchers": batcher_stats()}
+
+@app.get("/metrics")
+def prometheus_metrics():
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled (METRICS_ENABLED=false)")
+    return Response(metrics.render(), media_type=metrics.content_type())
 
 @app.post("/ask")
-def ask(req: AskReq):
-    res = answer(req.question, lang=req.lang, top_k=req.top_k)
+async def ask(req: AskReq, x_profile: Optional[str] = Header(None)):
+    _require_ready()
+    search = req.search.model_dump(exclude_none=True) if req.search else None
+    # "X-Profile: 1" asks for a sampling profile (only honoured with PROFILE_ENABLED)
+    profile = x_profile.lower() in ("1", "true", "yes") if x_profile else None
+    res = await answer_async(req.question, lang=req.lang, top_k=req.top_k, search=search, debug=req.debug,
+                             extractive=req.extractive, deadline_ms=req.deadline_ms, profile=profile)
     return res
+
+@app.post("/ask/stream")
+async def ask_stream(req: AskReq):
+    """Server-sent events: `sources`, then one `token` per text delta, then `done` (or `error`)."""
+    _require_ready()
+    search = req.search.model_dump(exclude_none=True) if req.search else None
+
+    stream = answer_stream(req.question, lang=req.lang, top_k=req.top_k, search=search,
+                           extractive=req.extractive, deadline_ms=req.deadline_ms)
+    # Run up to the first event here, so Saturated (and retrieval errors) still get a status code
+    first = await stream.__anext__()
+
+    async def events():
+        item = first
+        while True:
+            event, data = item
+            yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+            try:
+                item = await stream.__anext__()
+            except StopAsyncIteration:
+                return
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.post("/ask/batch")
+def ask_batch(req: AskBatchReq):
+    """Streams one NDJSON line per question, in completion order (each line carries its "index")."""
+    _require_ready()
+    lines = (json.dumps(r, ensure_ascii=False) + "\n"
+             for r in answer_batch(req.questions, lang=req.lang, top_k=req.top_k))
+    return StreamingResponse(lines, media_type="application/x-ndjson")
@@ -1,21 +1,29 @@
 import requests
+import httpx
+import asyncio
+import argparse
+import random
 import json
+import time
 
-def ask_question(question, lang=None, top_k=6):
+# Overall time budget per question; the server is told to answer slightly before it
+TIMEOUT_SECONDS = 60
+NETWORK_SLACK_SECONDS = 2
+
+def ask_question(question, lang=None, top_k=6, timeout=TIMEOUT_SECONDS):
     """Query the HTU RAG system"""
     url = "http://127.0.0.1:8000/ask"
     
     payload = {
         "question": question,
-        "top_k": top_k
+        "top_k": top_k,
+        "deadline_ms": int((timeout - NETWORK_SLACK_SECONDS) * 1000)
     }
     
     if lang:
         payload["lang"] = lang
     
     try:
-        # Increase timeout based on number of results
-        timeout = 30 + (top_k * 15)  # 30s base + 15s per result
         response = requests.post(url, json=payload, timeout=timeout)
         response.raise_for_status()
         
@@ -25,6 +33,8 @@ def ask_question(question, lang=None, top_k=6):
         print(f"Question: {question}")
         print("=" * 60)
         print(f"Answer: {result['answer']}")
+        if result.get("degraded"):
+            print(f"(degraded to meet the deadline: {', '.join(result['degraded'])})")
         print("\nSources:")
         for i, source in enumerate(result['sources'], 1):
             print(f"  {i}. {source}")
@@ -40,6 +50,301 @@ def ask_question(question, lang=None, top_k=6):
         print(f"Error: {e}")
         return None
 
+def ask_question_stream(question, lang=None, top_k=6, timeout=TIMEOUT_SECONDS):
+    """Query /ask/stream and print the answer token by token"""
+    url = "http://127.0.0.1:8000/ask/stream"
+    
+    payload = {"question": question, "top_k": top_k,
+               "deadline_ms": int((timeout - NETWORK_SLACK_SECONDS) * 1000)}
+    if lang:
+        payload["lang"] = lang
+    
+    start = time.perf_counter()
+    first_token = None
+    sources, answer, done = [], [], {}
+    try:
+        with requests.post(url, json=payload, stream=True, timeout=(10, timeout)) as response:
+            response.raise_for_status()
+            print("=" * 60)
+            print(f"Question: {question}")
+            print("=" * 60)
+            print("Answer: ", end="", flush=True)
+            event = None
+            for line in response.iter_lines(decode_unicode=True):
+                if line.startswith("event: "):
+                    event = line[7:]
+                elif line.startswith("data: "):
+                    data = json.loads(line[6:])
+                    if event == "sources":
+                        sources = data["sources"]
+                    elif event == "token":
+                        if first_token is None:
+                            first_token = time.perf_counter() - start
+                        answer.append(data["text"])
+                        print(data["text"], end="", flush=True)
+                    elif event == "done":
+                        done = data
+                    elif event == "error":
+                        print(f"\nError: {data['error']}")
+        print("\n\nSources:")
+        for i, source in enumerate(sources, 1):
+            print(f"  {i}. {source}")
+        if first_token is not None:
+            print(f"\nTime to first token: {first_token:.2f}s, total: {time.perf_counter() - start:.2f}s")
+        print("=" * 60)
+        return {"answer": "".join(answer), "sources": sources, **done}
+    
+    except requests.exceptions.RequestException as e:
+        print(f"Error connecting to API: {e}")
+        return None
+
+def ask_batch(path, lang=None, top_k=6):
+    """Send every question in a file (one per line) to /ask/batch and print answers as they stream in"""
+    url = "http://127.0.0.1:8000/ask/batch"
+    
+    with open(path, "r", encoding="utf-8") as f:
+        questions = [line.strip() for line in f if line.strip()]
+    
+    payload = {"questions": questions, "top_k": top_k}
+    if lang:
+        payload["lang"] = lang
+    
+    results = []
+    try:
+        with requests.post(url, json=payload, stream=True, timeout=(10, None)) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                result = json.loads(line)
+                results.append(result)
+                print(f"[{len(results)}/{len(questions)}] Q{result['index'] + 1}: {result['question']}")
+                print(f"  {result.get('answer') or result.get('error')}")
+        return results
+    
+    except requests.exceptions.RequestException as e:
+        print(f"Error connecting to API: {e}")
+        return results
+
+def load_questions(path):
+    """Questions to replay: plain text (one per line) or a JSONL query log ({"question", "lang", "top_k"} per line)"""
+    items = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("{"):
+                row = json.loads(line)
+                items.append({k: row[k] for k in ("question", "lang", "top_k") if row.get(k) is not None})
+            else:
+                items.append({"question": line})
+    if not items:
+        raise SystemExit(f"No questions in {path}")
+    return items
+
+def percentiles(values):
+    if not values:
+        return {}
+    v = sorted(values)
+    pick = lambda q: v[min(len(v) - 1, int(q * len(v)))]
+    return {"p50": round(pick(0.50), 1), "p95": round(pick(0.95), 1), "p99": round(pick(0.99), 1)}
+
+def _outcome(answer):
+    """What a 200 answer (or the stream's `done` event) was: "deadline" when the server ran out of time
+    before answering, "degraded" when it cut corners to meet the deadline, otherwise "ok"
+    """
+    if answer.get("path") == "timeout":
+        return "deadline"
+    return "degraded" if answer.get("degraded") else "ok"
+
+async def _load_request(client, base_url, item, stream, top_k, timeout):
+    """One request; returns {"status", "outcome", "latency_ms", "ttft_ms"} (status is the HTTP code, "error" or
+    "timeout"; outcome, for status 200, comes from _outcome)"""
+    payload = {"top_k": top_k, **item, "deadline_ms": int((timeout - NETWORK_SLACK_SECONDS) * 1000)}
+    start = time.perf_counter()
+    ms = lambda: (time.perf_counter() - start) * 1000
+    ttft = None
+    try:
+        if not stream:
+            r = await client.post(f"{base_url}/ask", json=payload)
+            await r.aread()
+            outcome = _outcome(r.json()) if r.status_code == 200 else None
+            return {"status": r.status_code, "outcome": outcome, "latency_ms": ms(), "ttft_ms": None}
+        async with client.stream("POST", f"{base_url}/ask/stream", json=payload) as r:
+            if r.status_code != 200:
+                await r.aread()
+                return {"status": r.status_code, "outcome": None, "latency_ms": ms(), "ttft_ms": None}
+            event, status, done = None, 200, None
+            async for line in r.aiter_lines():
+                if line.startswith("event: "):
+                    event = line[7:]
+                    if event == "token" and ttft is None:
+                        ttft = ms()
+                    elif event == "error":
+                        status = "error"
+                elif line.startswith("data: ") and event == "done":
+                    done = json.loads(line[6:])
+        if status == 200 and done is None:
+            status = "error"  # stream ended without `done`
+        outcome = _outcome(done) if status == 200 else None
+        return {"status": status, "outcome": outcome, "latency_ms": ms(), "ttft_ms": ttft}
+    except httpx.TimeoutException:
+        return {"status": "timeout", "outcome": None, "latency_ms": ms(), "ttft_ms": ttft}
+    except (httpx.HTTPError, ValueError):
+        return {"status": "error", "outcome": None, "latency_ms": ms(), "ttft_ms": ttft}
+
+def _stage_report(stage, results, mode, seconds):
+    # Only full answers count towards throughput and latency; degraded and deadline answers are reported apart
+    ok = [r for r in results if r["status"] == 200 and r["outcome"] == "ok"]
+    n = len(results) or 1
+    count = lambda *codes: sum(1 for r in results if r["status"] in codes)
+    outcomes = lambda o: sum(1 for r in results if r["status"] == 200 and r["outcome"] == o)
+    return {
+        "stage": stage["index"] + 1,
+        mode: stage["value"],
+        "seconds": round(seconds, 1),
+        "sent": len(results),
+        "ok": len(ok),
+        "throughput_rps": round(len(ok) / seconds, 2) if seconds else 0.0,
+        "latency_ms": percentiles([r["latency_ms"] for r in ok]),
+        "ttft_ms": percentiles([r["ttft_ms"] for r in ok if r["ttft_ms"] is not None]),
+        "rate_429": round(count(429) / n, 4),
+        "rate_503": round(count(503) / n, 4),
+        "degraded_rate": round(outcomes("degraded") / n, 4),
+        "deadline_rate": round(outcomes("deadline") / n, 4),
+        "error_rate": round(sum(1 for r in results if r["status"] not in (200, 429, 503)) / n, 4),
+    }
+
+async def run_load(questions, stages, mode="qps", base_url="http://127.0.0.1:8000", stream=False,
+                   top_k=6, timeout=TIMEOUT_SECONDS, poisson=False, shuffle=False, max_in_flight=1000):
+    """Replays `questions` through `stages` [(value, seconds), ...]: requests per second in "qps" mode
+    (open loop: arrivals don't wait for responses) or parallel clients in "concurrency" mode (closed loop)."""
+    order = list(questions)
+    if shuffle:
+        random.shuffle(order)
+    counter = iter(range(1 << 62))
+    next_item = lambda: order[next(counter) % len(order)]
+    limits = httpx.Limits(max_connections=max_in_flight, max_keepalive_connections=max_in_flight)
+    reports = []
+    async with httpx.AsyncClient(limits=limits, timeout=httpx.Timeout(timeout, connect=10)) as client:
+        for index, (value, seconds) in enumerate(stages):
+            stage = {"index": index, "value": value}
+            results, tasks = [], set()
+            in_flight = asyncio.Semaphore(max_in_flight)
+            start = time.perf_counter()
+            end = start + seconds
+
+            async def one():
+                async with in_flight:
+                    results.append(await _load_request(client, base_url, next_item(), stream, top_k, timeout))
+
+            if mode == "qps":
+                at = start
+                while at < end:
+                    await asyncio.sleep(max(0.0, at - time.perf_counter()))
+                    t = asyncio.create_task(one())
+                    tasks.add(t)
+                    t.add_done_callback(tasks.discard)
+                    at += random.expovariate(value) if poisson else 1.0 / value
+            else:
+                async def worker():
+                    while time.perf_counter() < end:
+                        await one()
+                await asyncio.gather(*(worker() for _ in range(int(value))))
+            if tasks:
+                await asyncio.wait(tasks)
+            # Stragglers may finish after the stage; a stage never counts as shorter than planned
+            rep = _stage_report(stage, results, mode, max(seconds, time.perf_counter() - start))
+            reports.append(rep)
+            print_stage(rep, mode)
+    return reports
+
+def print_stage(rep, mode):
+    lat, ttft = rep["latency_ms"], rep["ttft_ms"]
+    line = (f"[load] stage {rep['stage']}: {mode}={rep[mode]} sent={rep['sent']} ok={rep['ok']} "
+            f"{rep['throughput_rps']} req/s  p50/p95/p99 {lat.get('p50')}/{lat.get('p95')}/{lat.get('p99')} ms")
+    if ttft:
+        line += f"  ttft p50/p95 {ttft['p50']}/{ttft['p95']} ms"
+    line += (f"  429 {rep['rate_429']:.1%}  503 {rep['rate_503']:.1%}  errors {rep['error_rate']:.1%}"
+             f"  degraded {rep['degraded_rate']:.1%}  deadline {rep['deadline_rate']:.1%}")
+    print(line, flush=True)
+
+def saturation_stage(reports, mode):
+    """First stage where the server stopped keeping up: >1% rejected, failed or out of time, throughput below 90% of
+    the offered rate (qps mode), or less than 5% more throughput than the stage before (concurrency mode)."""
+    prev = None
+    for rep in reports:
+        failed = rep["rate_429"] + rep["rate_503"] + rep["error_rate"] + rep["deadline_rate"]
+        if failed > 0.01:
+            return rep
+        if mode == "qps" and rep["throughput_rps"] < 0.9 * rep["qps"]:
+            return rep
+        if mode == "concurrency" and prev and rep["throughput_rps"] < 1.05 * prev["throughput_rps"]:
+            return rep
+        prev = rep
+    return None
+
+def parse_stages(text, value, duration):
+    """"2:30,4:30,8:60" -> [(2.0, 30.0), (4.0, 30.0), (8.0, 60.0)]; without --stages one stage of `duration`"""
+    if not text:
+        return [(value, duration)]
+    stages = []
+    for part in text.split(","):
+        v, _, secs = part.partition(":")
+        stages.append((float(v), float(secs) if secs else duration))
+    for v, secs in stages:
+        if v <= 0 or secs <= 0:
+            raise ValueError(f"stage {v:g}:{secs:g} needs a positive rate and duration")
+    return stages
+
+def load_test(argv):
+    ap = argparse.ArgumentParser(prog="query_system.py --load", description="Replay questions against the API under load.")
+    ap.add_argument("questions", help="text file (one question per line) or JSONL query log")
+    rate = ap.add_mutually_exclusive_group()
+    rate.add_argument("--qps", type=float, help="requests per second, open loop (default 1)")
+    rate.add_argument("--concurrency", type=int, help="parallel clients, closed loop")
+    ap.add_argument("--stages", help='ramp as "value:seconds,..." (e.g. "1:30,2:30,4:30"), in QPS or clients')
+    ap.add_argument("--duration", type=float, default=30, help="seconds per stage without --stages")
+    ap.add_argument("--stream", action="store_true", help="use /ask/stream and measure time to first token")
+    ap.add_argument("--poisson", action="store_true", help="exponential inter-arrival times in QPS mode")
+    ap.add_argument("--shuffle", action="store_true")
+    ap.add_argument("--top-k", type=int, default=6)
+    ap.add_argument("--timeout", type=float, default=TIMEOUT_SECONDS)
+    ap.add_argument("--max-in-flight", type=int, default=1000)
+    ap.add_argument("--url", default="http://127.0.0.1:8000")
+    ap.add_argument("--json", metavar="PATH", help="also write the per-stage report as JSON")
+    args = ap.parse_args(argv)
+    if args.timeout <= NETWORK_SLACK_SECONDS:
+        ap.error(f"--timeout must be more than {NETWORK_SLACK_SECONDS}s (the server is asked to answer that much sooner)")
+
+    for name in ("qps", "concurrency", "duration"):
+        if getattr(args, name) is not None and getattr(args, name) <= 0:
+            ap.error(f"--{name} must be positive")
+
+    mode = "concurrency" if args.concurrency else "qps"
+    value = args.concurrency or args.qps or 1.0
+    try:
+        stages = parse_stages(args.stages, value, args.duration)
+    except ValueError as e:
+        ap.error(f"--stages: {e}")
+    questions = load_questions(args.questions)
+    print(f"[load] {len(questions)} questions, {mode} stages {stages}, "
+          f"{'/ask/stream' if args.stream else '/ask'} at {args.url}")
+    reports = asyncio.run(run_load(questions, stages, mode, args.url.rstrip("/"), args.stream, args.top_k,
+                                   args.timeout, args.poisson, args.shuffle, args.max_in_flight))
+    sat = saturation_stage(reports, mode)
+    if sat:
+        print(f"[load] saturation at stage {sat['stage']} ({mode}={sat[mode]}): "
+              f"{sat['throughput_rps']} req/s, p95 {sat['latency_ms'].get('p95')} ms")
+    else:
+        print("[load] no saturation within the stages run")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"mode": mode, "stream": args.stream, "stages": reports,
+                       "saturation_stage": sat["stage"] if sat else None}, f, indent=2)
+    return reports
+
 def interactive_mode():
     """Run in interactive mode"""
     print("HTU RAG System Query Tool")
@@ -75,7 +380,16 @@ def interactive_mode():
 if __name__ == "__main__":
     import sys
     
-    if len(sys.argv) > 1:
+    if len(sys.argv) > 2 and sys.argv[1] == "--load":
+        # Load test: replay a question file at a target QPS or concurrency
+        load_test(sys.argv[2:])
+    elif len(sys.argv) > 2 and sys.argv[1] == "--batch":
+        # Batch mode: questions file, one per line
+        ask_batch(sys.argv[2])
+    elif len(sys.argv) > 2 and sys.argv[1] == "--stream":
+        # Streaming mode: print tokens as they arrive
+        ask_question_stream(" ".join(sys.argv[2:]))
+    elif len(sys.argv) > 1:
         # Command line mode
         question = " ".join(sys.argv[1:])
         ask_question(question)
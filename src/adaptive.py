@@ -0,0 +1,107 @@
+"""Confidence-based reranking policy and its offline evaluation.
+
+`rerank_policy` looks at the dense (cosine) scores of the first candidate pool:
+
+  skip    top score >= ADAPTIVE_SKIP_TOP_SCORE and top1 - top2 >= ADAPTIVE_SKIP_MARGIN
+  grow    top score minus the last candidate's score < ADAPTIVE_FLAT_SPREAD,
+          i.e. dense retrieval cannot tell candidates apart; fetch
+          limit * ADAPTIVE_MAX_FACTOR candidates before reranking
+  rerank  otherwise
+
+Evaluate on a question file (one question per line):
+
+  python -m src.adaptive questions.txt --top-k 6 [--lang en]
+"""
+import sys, time, json, argparse
+from typing import List
+
+try:
+    from .config import (
+        TOP_K, ADAPTIVE_SKIP_TOP_SCORE, ADAPTIVE_SKIP_MARGIN, ADAPTIVE_FLAT_SPREAD
+    )
+except ImportError:
+    from config import (
+        TOP_K, ADAPTIVE_SKIP_TOP_SCORE, ADAPTIVE_SKIP_MARGIN, ADAPTIVE_FLAT_SPREAD
+    )
+
+def rerank_policy(scores: List[float], limit: int) -> str:
+    if not scores:
+        return "rerank"
+    if (scores[0] >= ADAPTIVE_SKIP_TOP_SCORE and
+            (len(scores) == 1 or scores[0] - scores[1] >= ADAPTIVE_SKIP_MARGIN)):
+        return "skip"
+    if len(scores) > limit and scores[0] - scores[-1] < ADAPTIVE_FLAT_SPREAD:
+        return "grow"
+    return "rerank"
+
+def _doc_key(d: dict) -> str:
+    return d.get("id") or d["url"]
+
+def _pct(xs: List[float], p: float) -> float:
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(round(p / 100 * (len(xs) - 1))))] if xs else 0.0
+
+def evaluate(questions: List[str], lang: str | None = None, top_k: int = TOP_K) -> dict:
+    """Run every question with the fixed policy (always rerank) and the adaptive one."""
+    try:
+        from .rag_service_local import get_retriever
+        from .cache import LRUCache
+    except ImportError:
+        from rag_service_local import get_retriever
+        from cache import LRUCache
+    retriever = get_retriever()
+    if retriever.reranker is None:
+        raise SystemExit("ENABLE_RERANKER is off; nothing to evaluate.")
+    # Score caching would make whichever run goes second look cheaper
+    retriever.rerank_cache = LRUCache(0)
+
+    base_ms, adapt_ms, rows = [], [], []
+    decisions = {"skip": 0, "grow": 0, "rerank": 0}
+    top1_same = overlap = 0.0
+    for q in questions:
+        retriever.embed(q)  # keep encoder time out of both measurements
+        t0 = time.perf_counter()
+        base, _ = retriever.search(q, lang=lang, limit=top_k, adaptive=False)
+        t1 = time.perf_counter()
+        info = {}
+        adapt, _ = retriever.search(q, lang=lang, limit=top_k, adaptive=True, info=info)
+        t2 = time.perf_counter()
+
+        b, a = [_doc_key(d) for d in base], [_doc_key(d) for d in adapt]
+        same_top1 = bool(b and a and b[0] == a[0])
+        ov = len(set(a) & set(b)) / max(len(b), 1)
+        decisions[info.get("rerank_policy", "rerank")] += 1
+        top1_same += same_top1
+        overlap += ov
+        base_ms.append((t1 - t0) * 1000)
+        adapt_ms.append((t2 - t1) * 1000)
+        rows.append({"question": q, "policy": info.get("rerank_policy"), "top1_same": same_top1,
+                     "overlap_at_k": ov, "fixed_ms": base_ms[-1], "adaptive_ms": adapt_ms[-1]})
+
+    n = max(len(questions), 1)
+    return {
+        "questions": len(questions),
+        "top_k": top_k,
+        "decisions": decisions,
+        "fixed_ms": {"mean": sum(base_ms) / n, "p50": _pct(base_ms, 50), "p95": _pct(base_ms, 95)},
+        "adaptive_ms": {"mean": sum(adapt_ms) / n, "p50": _pct(adapt_ms, 50), "p95": _pct(adapt_ms, 95)},
+        "saved_ms_mean": (sum(base_ms) - sum(adapt_ms)) / n,
+        "top1_agreement": top1_same / n,
+        "mean_overlap_at_k": overlap / n,
+        "per_question": rows,
+    }
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Compare adaptive reranking against always-rerank.")
+    ap.add_argument("questions", help="text file, one question per line")
+    ap.add_argument("--lang", default=None)
+    ap.add_argument("--top-k", type=int, default=TOP_K)
+    ap.add_argument("--summary", action="store_true", help="omit per-question rows")
+    args = ap.parse_args()
+    with open(args.questions, "r", encoding="utf-8") as f:
+        qs = [l.strip() for l in f if l.strip()]
+    rep = evaluate(qs, lang=args.lang, top_k=args.top_k)
+    if args.summary:
+        rep.pop("per_question")
+    json.dump(rep, sys.stdout, indent=2, ensure_ascii=False)
+    print()
@@ -0,0 +1,199 @@
+"""Admission control for LLM generations.
+
+At most LLM_CONCURRENCY generations run at once. Further callers wait in a
+priority queue (INTERACTIVE before BATCH, FIFO within a priority). At most
+LLM_QUEUE_SIZE requests wait ahead of a new interactive one (queued batch
+work, which sits behind it, does not count), for at most LLM_QUEUE_MAX_WAIT
+seconds. When the queue is full, or the wait runs out, `Saturated` is raised right away with a
+Retry-After estimate instead of letting the request sit until the HTTP
+timeout. A freed slot is handed straight to the next waiter, so a newcomer
+cannot overtake the queue.
+
+Sync callers (batch threads) and async callers (the event loop) share the
+same slots.
+"""
+import asyncio, heapq, itertools, math, threading, time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Optional
+
+try:
+    from .config import LLM_CONCURRENCY, LLM_QUEUE_SIZE, LLM_QUEUE_MAX_WAIT
+except ImportError:
+    from config import LLM_CONCURRENCY, LLM_QUEUE_SIZE, LLM_QUEUE_MAX_WAIT
+
+INTERACTIVE = 0
+BATCH = 1
+_NAMES = {INTERACTIVE: "interactive", BATCH: "batch"}
+
+class Saturated(Exception):
+    """No generation slot; `reason` is "queue_full" or "timeout"."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"LLM saturated ({reason}); retry after {retry_after}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+class _Waiter:
+    __slots__ = ("priority", "granted", "cancelled", "event", "loop", "fut")
+
+    def __init__(self, priority: int, loop=None):
+        self.priority = priority
+        self.granted = False
+        self.cancelled = False
+        self.loop = loop
+        self.event = None if loop else threading.Event()
+        self.fut = loop.create_future() if loop else None
+
+    def wake(self):
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(lambda: self.fut.done() or self.fut.set_result(True))
+
+class AdmissionController:
+    def __init__(self, limit: int = LLM_CONCURRENCY, max_queue: int = LLM_QUEUE_SIZE,
+                 max_wait: float = LLM_QUEUE_MAX_WAIT):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.active = 0
+        self._lock = threading.Lock()
+        self._heap: list = []
+        self._seq = itertools.count()
+        self._queued = {p: 0 for p in _NAMES}
+        self._hold_ewma = 5.0  # seconds per generation, seeds the Retry-After estimate
+        self.counters = {"admitted": 0, "queued": 0, "rejected": 0, "timeouts": 0}
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    # -- bookkeeping (caller holds the lock) --
+
+    def _try_enter(self) -> bool:
+        if self.limit <= 0 or (self.active < self.limit and not self._queued_total()):
+            self.active += 1
+            self.counters["admitted"] += 1
+            return True
+        return False
+
+    def _queued_total(self) -> int:
+        return sum(self._queued.values())
+
+    def _retry_after(self) -> int:
+        backlog = self._queued_total() + self.active
+        return max(1, math.ceil(backlog * self._hold_ewma / max(self.limit, 1)))
+
+    def _enqueue(self, w: _Waiter, bounded: bool):
+        # Only waiters that would be served first count; batch work behind an interactive request doesn't
+        ahead = sum(n for p, n in self._queued.items() if p <= w.priority)
+        if bounded and ahead >= self.max_queue:
+            self.counters["rejected"] += 1
+            raise Saturated("queue_full", self._retry_after())
+        heapq.heappush(self._heap, (w.priority, next(self._seq), w))
+        self._queued[w.priority] += 1
+        self.counters["queued"] += 1
+
+    def _dequeue(self, w: _Waiter):
+        w.cancelled = True
+        self._queued[w.priority] -= 1
+
+    def _note_wait(self, seconds: float):
+        self._wait_total += seconds
+        self._wait_max = max(self._wait_max, seconds)
+
+    def _timeout(self, w: _Waiter):
+        self._dequeue(w)
+        self.counters["timeouts"] += 1
+        raise Saturated("timeout", self._retry_after())
+
+    # -- acquire / release --
+
+    def acquire(self, priority: int = INTERACTIVE, max_wait: Optional[float] = -1):
+        """Blocks for a slot. `max_wait=None` waits indefinitely and is not bounded by the queue size."""
+        max_wait = self.max_wait if max_wait == -1 else max_wait
+        t0 = time.monotonic()
+        with self._lock:
+            if self._try_enter():
+                return
+            w = _Waiter(priority)
+            self._enqueue(w, bounded=max_wait is not None)
+        w.event.wait(max_wait)
+        with self._lock:
+            self._note_wait(time.monotonic() - t0)
+            if not w.granted:
+                self._timeout(w)
+
+    async def acquire_async(self, priority: int = INTERACTIVE, max_wait: Optional[float] = -1):
+        max_wait = self.max_wait if max_wait == -1 else max_wait
+        t0 = time.monotonic()
+        with self._lock:
+            if self._try_enter():
+                return
+            w = _Waiter(priority, asyncio.get_running_loop())
+            self._enqueue(w, bounded=max_wait is not None)
+        try:
+            await asyncio.wait_for(asyncio.shield(w.fut), max_wait)
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            with self._lock:
+                granted = w.granted
+                if not granted:
+                    self._dequeue(w)
+            if granted:
+                self.release(0.0)
+            raise
+        with self._lock:
+            self._note_wait(time.monotonic() - t0)
+            if not w.granted:
+                self._timeout(w)
+
+    def release(self, held: float = 0.0):
+        with self._lock:
+            if held:
+                self._hold_ewma = 0.8 * self._hold_ewma + 0.2 * held
+            while self._heap:
+                _, _, w = heapq.heappop(self._heap)
+                if w.cancelled:
+                    continue
+                # Hand the slot over directly; `active` stays the same
+                self._queued[w.priority] -= 1
+                w.granted = True
+                self.counters["admitted"] += 1
+                w.wake()
+                return
+            self.active -= 1
+
+    @contextmanager
+    def slot(self, priority: int = INTERACTIVE, max_wait: Optional[float] = -1):
+        self.acquire(priority, max_wait)
+        t0 = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - t0)
+
+    @asynccontextmanager
+    async def aslot(self, priority: int = INTERACTIVE, max_wait: Optional[float] = -1):
+        await self.acquire_async(priority, max_wait)
+        t0 = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - t0)
+
+    def stats(self) -> dict:
+        with self._lock:
+            waited = self.counters["queued"] - self._queued_total()
+            return {
+                "limit": self.limit,
+                "active": self.active,
+                "queue_depth": self._queued_total(),
+                "queue_depth_by_priority": {_NAMES[p]: n for p, n in self._queued.items()},
+                "max_queue": self.max_queue,
+                "max_wait_s": self.max_wait,
+                **self.counters,
+                "mean_wait_ms": (self._wait_total / waited * 1000) if waited else 0.0,
+                "max_wait_ms": self._wait_max * 1000,
+                "mean_generation_s": round(self._hold_ewma, 2),
+                "retry_after_s": self._retry_after(),
+            }
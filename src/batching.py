@@ -0,0 +1,80 @@
+import time, queue, threading
+from concurrent.futures import Future
+from typing import Any, Callable, List
+
+class MicroBatcher:
+    """Coalesces concurrent calls of a batch function into one forward pass.
+
+    Callers `submit(items)` and get a Future for their own slice of the
+    results. A background thread takes the first pending request, then keeps
+    collecting until `max_batch` items are gathered or `max_wait_ms` has passed,
+    runs `fn(all_items)` once and splits the output back.
+    """
+
+    def __init__(self, fn: Callable[[List[Any]], List[Any]], max_batch: int = 32,
+                 max_wait_ms: float = 5.0, name: str = "batcher"):
+        self.fn = fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.batches = 0
+        self.items = 0
+        self._q: "queue.Queue[tuple[List[Any], Future]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, items: List[Any]) -> Future:
+        fut: Future = Future()
+        if not items:
+            fut.set_result([])
+        else:
+            self._q.put((list(items), fut))
+        return fut
+
+    def __call__(self, items: List[Any]) -> List[Any]:
+        return self.submit(items).result()
+
+    def _collect(self) -> List[tuple]:
+        reqs = [self._q.get()]
+        n = len(reqs[0][0])
+        deadline = time.monotonic() + self.max_wait
+        while n < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                req = self._q.get(timeout=remaining)
+            except queue.Empty:
+                break
+            reqs.append(req)
+            n += len(req[0])
+        return reqs
+
+    def _run(self):
+        while True:
+            # Futures cancelled while queued are dropped; the rest can no longer be cancelled
+            reqs = [(items, fut) for items, fut in self._collect() if fut.set_running_or_notify_cancel()]
+            if not reqs:
+                continue
+            flat = [x for items, _ in reqs for x in items]
+            try:
+                out = list(self.fn(flat))
+            except Exception as e:
+                for _, fut in reqs:
+                    fut.set_exception(e)
+                continue
+            self.batches += 1
+            self.items += len(flat)
+            i = 0
+            for items, fut in reqs:
+                fut.set_result(out[i:i+len(items)])
+                i += len(items)
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch": (self.items / self.batches) if self.batches else 0.0,
+            "pending": self._q.qsize(),
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000,
+        }
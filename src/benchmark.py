@@ -0,0 +1,334 @@
+"""Offline end-to-end latency benchmark.
+
+Runs the real request path (`rag_service_local.answer`) on a CPU box with no
+network and no model weights:
+
+  corpus     synthetic English / Arabic pages (departments, fees, phones,
+             deadlines), chunked like the crawler does
+  index      built by the indexer into an in-memory Qdrant collection that the
+             service then searches (QdrantStore), or with --backend local into
+             a local index in a temporary directory
+  embedder   EMBEDDING_BACKEND=hash, reranker RERANKER_BACKEND=overlap
+  LLM        ollama_stub.StubOllama with configurable prefill / token latency
+
+and reports per-stage (embed, search, rerank, context, extract, llm) and
+end-to-end latency percentiles as JSON. Caches are off unless --caches, so
+repeated questions measure the full path. Everything is seeded, so results
+from two commits on the same machine can be compared:
+
+  python -m src.benchmark run --out bench/base.json
+  python -m src.benchmark run --out bench/new.json
+  python -m src.benchmark compare bench/base.json bench/new.json --tolerance 0.15
+
+`compare` exits with status 1 when a p50 or p95 got slower by more than the
+tolerance (and by more than --min-ms, to ignore noise on fast stages).
+
+Settings are read from the environment when `config` is imported, so `run`
+sets the backends, index directory and Ollama URL before loading the service.
+Other settings (MICROBATCH_*, CONTEXT_TOKEN_BUDGET, ...) apply as usual.
+"""
+import os, json, time, random, shutil, socket, argparse, platform, tempfile, subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+STAGES = ("embed", "search", "rerank", "context", "extract", "llm")
+
+DEPARTMENTS = [
+    ("Computer Science", "علوم الحاسوب"),
+    ("Cyber Security", "الأمن السيبراني"),
+    ("Data Science and Artificial Intelligence", "علم البيانات والذكاء الاصطناعي"),
+    ("Electrical Engineering", "الهندسة الكهربائية"),
+    ("Mechanical Engineering", "الهندسة الميكانيكية"),
+    ("Renewable Energy Engineering", "هندسة الطاقة المتجددة"),
+    ("Game Design and Development", "تصميم وتطوير الألعاب"),
+    ("Business Technology", "تكنولوجيا الأعمال"),
+    ("Industrial Engineering", "الهندسة الصناعية"),
+    ("Architecture", "العمارة"),
+    ("Civil Engineering", "الهندسة المدنية"),
+    ("Networks and Cloud Computing", "الشبكات والحوسبة السحابية"),
+]
+
+TOPICS = {
+    "phone": (
+        "The {dept} department can be reached by phone at 06 580 {n:04d}, extension {ext}, "
+        "Sunday to Thursday from 8:30 to 16:00.",
+        "يمكن التواصل مع قسم {dept} على الرقم 06 580 {n:04d} فرعي {ext} من الأحد إلى الخميس من 8:30 إلى 16:00.",
+    ),
+    "fees": (
+        "Tuition for the {dept} bachelor's programme is {fee} JOD per credit hour; "
+        "the programme has {hours} credit hours in total.",
+        "رسوم الساعة المعتمدة في برنامج بكالوريوس {dept} هي {fee} دينار، ومجموع ساعات البرنامج {hours} ساعة.",
+    ),
+    "deadline": (
+        "Applications to {dept} for the autumn semester close on {day} August; "
+        "late applications are reviewed only if seats remain.",
+        "يغلق باب التقديم لقسم {dept} للفصل الأول في {day} آب، وتُدرس الطلبات المتأخرة فقط في حال توفر مقاعد.",
+    ),
+    "admission": (
+        "Admission to {dept} requires a secondary school average of at least {avg}% "
+        "and passing the university placement test in English and mathematics.",
+        "يشترط للقبول في قسم {dept} معدل ثانوية عامة لا يقل عن {avg}% واجتياز امتحان المستوى في اللغة الإنجليزية والرياضيات.",
+    ),
+    "office": (
+        "The {dept} office is in building {bldg}, room {room}, on the main campus.",
+        "يقع مكتب قسم {dept} في المبنى {bldg} غرفة {room} في الحرم الرئيسي.",
+    ),
+}
+
+QUESTIONS = {
+    "phone": ("What is the phone number of the {dept} department?", "ما هو رقم هاتف قسم {dept}؟"),
+    "fees": ("How much is tuition per credit hour in {dept}?", "كم رسوم الساعة المعتمدة في {dept}؟"),
+    "deadline": ("When is the application deadline for {dept}?", "متى يغلق باب التقديم لقسم {dept}؟"),
+    "admission": ("What are the admission requirements for {dept}?", "ما هي شروط القبول في قسم {dept}؟"),
+    "office": ("Where is the {dept} office?", "أين يقع مكتب قسم {dept}؟"),
+}
+
+FILLER = (
+    ("Students are encouraged to follow the university announcements page for updates.",
+     "The university works with industry partners to offer internships and applied projects.",
+     "More information is available from the admissions and registration unit.",
+     "Courses combine lectures, laboratory work and project-based learning."),
+    ("يمكن متابعة صفحة الإعلانات في الجامعة للاطلاع على آخر المستجدات.",
+     "تتعاون الجامعة مع شركاء من القطاع الصناعي لتوفير فرص التدريب والمشاريع التطبيقية.",
+     "تتوفر معلومات إضافية لدى وحدة القبول والتسجيل.",
+     "تجمع المساقات بين المحاضرات والعمل المخبري والتعلم القائم على المشاريع."),
+)
+
+def synthetic_corpus(pages: int, seed: int = 0, chunk_size: int = 1400) -> List[Dict]:
+    """Crawler-shaped rows: one page per (department, topic, language) combination, cycled to `pages`."""
+    try:
+        from .chunker import split_into_chunks
+    except ImportError:
+        from chunker import split_into_chunks
+    rng = random.Random(seed)
+    combos = [(d, t, li) for d in range(len(DEPARTMENTS)) for t in TOPICS for li in (0, 1)]
+    rows = []
+    for p in range(pages):
+        d, topic, li = combos[p % len(combos)]
+        lang = ("en", "ar")[li]
+        dept = DEPARTMENTS[d][li]
+        facts = dict(dept=dept, n=1000 + 37 * d, ext=100 + d, fee=60 + 5 * d, hours=132 + 3 * (d % 4),
+                     day=10 + d % 15, avg=65 + d % 20, bldg=chr(ord("A") + d % 6), room=100 + 11 * d)
+        sentences = [TOPICS[topic][li].format(**facts)]
+        # Pad to a realistic page length with filler and other departments' facts
+        target = rng.randint(600, 2400)
+        while sum(map(len, sentences)) < target:
+            if rng.random() < 0.3:
+                other = rng.randrange(len(DEPARTMENTS))
+                sentences.append(TOPICS[rng.choice(list(TOPICS))][li].format(**{**facts, "dept": DEPARTMENTS[other][li]}))
+            else:
+                sentences.append(rng.choice(FILLER[li]))
+        url = f"https://bench.local/{lang}/{topic}/{d}/{p}"
+        title = f"{dept} - {topic}"
+        for i, ch in enumerate(split_into_chunks(" ".join(sentences), chunk_size=chunk_size, overlap=150)):
+            rows.append({"id": f"{url}#chunk={i}", "url": url, "title": title, "content": ch, "lang": lang,
+                         "last_modified": None, "content_type": "html"})
+    return rows
+
+def synthetic_questions(n: int, seed: int = 0) -> List[Dict]:
+    rng = random.Random(seed + 1)
+    out = []
+    for _ in range(n):
+        d, topic, li = rng.randrange(len(DEPARTMENTS)), rng.choice(list(QUESTIONS)), rng.randrange(2)
+        out.append({"question": QUESTIONS[topic][li].format(dept=DEPARTMENTS[d][li]), "lang": ("en", "ar")[li]})
+    return out
+
+def percentiles(values: List[float]) -> Dict:
+    if not values:
+        return {"n": 0}
+    v = sorted(values)
+    pick = lambda q: v[min(len(v) - 1, int(q * len(v)))]
+    return {"n": len(v), "mean": round(sum(v) / len(v), 3), "p50": round(pick(0.50), 3),
+            "p95": round(pick(0.95), 3), "p99": round(pick(0.99), 3), "max": round(v[-1], 3)}
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+def _hermetic_env(args, workdir: str, port: int):
+    env = {
+        "VECTOR_BACKEND": args.backend, "LOCAL_INDEX_DIR": os.path.join(workdir, "index"), "LOCAL_INDEX_HNSW": "false",
+        "EMBEDDING_BACKEND": "hash", "EMBEDDING_MODEL": "bench-hash", "EMBEDDING_HASH_DIM": str(args.dim),
+        "ENABLE_RERANKER": "true" if args.rerank else "false", "RERANKER_BACKEND": "overlap",
+        "OLLAMA_URL": f"http://127.0.0.1:{port}", "OLLAMA_URLS": f"http://127.0.0.1:{port}",
+        "EXTRACTIVE_ENABLED": "true" if args.extractive else "false",
+        "METRICS_ENABLED": "false", "PROFILE_ENABLED": "false",
+    }
+    if not args.caches:
+        env.update(EMBED_CACHE_SIZE="0", RERANK_CACHE_SIZE="0", ANSWER_CACHE_SIZE="0")
+    os.environ.update(env)
+
+def run(args) -> Dict:
+    workdir = args.workdir or tempfile.mkdtemp(prefix="htu-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    try:
+        return _run(args, workdir)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+def _run(args, workdir: str) -> Dict:
+    port = _free_port()
+    _hermetic_env(args, workdir, port)
+    # Only now: these read the environment on import
+    try:
+        from . import rag_service_local as rag, metrics
+        from .config import LOCAL_INDEX_DIR
+        from .embeddings import load_embedder
+        from .cache import text_hash
+        from .snapshot import corpus_hash
+        from .indexer_qdrant import index_local, index_qdrant
+        from .vector_store import QdrantStore
+        from .ollama_client import llm_stats
+        from .ollama_stub import StubOllama
+    except ImportError:
+        import rag_service_local as rag, metrics
+        from config import LOCAL_INDEX_DIR
+        from embeddings import load_embedder
+        from cache import text_hash
+        from snapshot import corpus_hash
+        from indexer_qdrant import index_local, index_qdrant
+        from vector_store import QdrantStore
+        from ollama_client import llm_stats
+        from ollama_stub import StubOllama
+
+    rows = synthetic_corpus(args.pages, args.seed)
+    corpus = os.path.join(workdir, "corpus.jsonl")
+    with open(corpus, "w", encoding="utf-8") as f:
+        for r in rows:
+            r["content_hash"] = text_hash(r["content"])
+            f.write(json.dumps(r, ensure_ascii=False) + "\n")
+    store = None
+    t0 = time.perf_counter()
+    if args.backend == "qdrant":
+        from qdrant_client import QdrantClient
+        client = QdrantClient(":memory:")  # the indexer and the service share it
+        index_qdrant(load_embedder(), rows, corpus_hash(corpus), client=client)
+        store = QdrantStore(client=client)
+    else:
+        index_local(load_embedder(), rows, corpus_hash(corpus), path=LOCAL_INDEX_DIR, hnsw=False)
+    index_s = time.perf_counter() - t0
+
+    stub = StubOllama(port=port, token_ms=args.token_ms, first_token_ms=args.first_token_ms,
+                      tokens=args.tokens, prefill_ms_per_token=args.prefill_ms_per_token).start()
+    try:
+        t0 = time.perf_counter()
+        rag.load(store)
+        load_s = time.perf_counter() - t0
+        questions = synthetic_questions(args.requests, args.seed)
+        for q in synthetic_questions(args.warmup, args.seed + 100):
+            rag.answer(q["question"], lang=q["lang"], top_k=args.top_k)
+
+        def one(q: Dict) -> Dict:
+            with metrics.timings() as st:
+                t = time.perf_counter()
+                res = rag.answer(q["question"], lang=q["lang"], top_k=args.top_k)
+                total = time.perf_counter() - t
+            return {"total": total, "stages": st, "path": res.get("path"), "degraded": res.get("degraded")}
+
+        t0 = time.perf_counter()
+        if args.concurrency > 1:
+            with ThreadPoolExecutor(max_workers=args.concurrency, thread_name_prefix="bench") as pool:
+                results = list(pool.map(one, questions))
+        else:
+            results = [one(q) for q in questions]
+        wall = time.perf_counter() - t0
+        llm = llm_stats()
+    finally:
+        stub.stop()
+
+    paths: Dict[str, int] = {}
+    for r in results:
+        paths[r["path"]] = paths.get(r["path"], 0) + 1
+    return {
+        "meta": {
+            "commit": _git_commit(), "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count(),
+            "args": {k: v for k, v in vars(args).items() if k not in ("cmd", "out", "workdir")},
+        },
+        "corpus": {"pages": args.pages, "chunks": len(rows), "index_s": round(index_s, 3), "load_s": round(load_s, 3)},
+        "end_to_end_ms": percentiles([r["total"] * 1000 for r in results]),
+        "stages_ms": {s: percentiles([r["stages"][s] * 1000 for r in results if s in r["stages"]]) for s in STAGES},
+        "throughput_rps": round(len(results) / wall, 2) if wall else None,
+        "paths": paths,
+        "degraded": sum(1 for r in results if r["degraded"]),
+        "llm": {k: llm[k] for k in ("requests", "mean_prompt_tokens", "mean_prefill_ms", "eval_tokens_per_s")},
+    }
+
+def compare(base: Dict, new: Dict, tolerance: float, min_ms: float) -> List[str]:
+    """Regressions of `new` against `base`: p50 / p95 that grew by more than `tolerance` and `min_ms`."""
+    rows = [("end_to_end", base["end_to_end_ms"], new["end_to_end_ms"])]
+    rows += [(s, base["stages_ms"].get(s, {}), new["stages_ms"].get(s, {})) for s in STAGES]
+    out = []
+    for name, b, n in rows:
+        for q in ("p50", "p95"):
+            if q not in b or q not in n:
+                continue
+            delta = n[q] - b[q]
+            flag = delta > min_ms and delta > tolerance * b[q]
+            line = f"{name:11s} {q}  {b[q]:9.2f} -> {n[q]:9.2f} ms  ({delta / b[q] * 100 if b[q] else 0:+.1f}%)"
+            print(("REGRESSION " if flag else "           ") + line)
+            if flag:
+                out.append(line)
+    return out
+
+def main():
+    ap = argparse.ArgumentParser(description="Offline end-to-end latency benchmark.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    r = sub.add_parser("run", help="build a synthetic index, answer questions against a stub LLM")
+    r.add_argument("--pages", type=int, default=600)
+    r.add_argument("--requests", type=int, default=200)
+    r.add_argument("--warmup", type=int, default=10)
+    r.add_argument("--concurrency", type=int, default=1)
+    r.add_argument("--top-k", type=int, default=6)
+    r.add_argument("--seed", type=int, default=0)
+    r.add_argument("--backend", choices=["qdrant", "local"], default="qdrant",
+                   help="vector store: in-memory Qdrant (default) or the local index")
+    r.add_argument("--dim", type=int, default=384, help="hash embedding dimension")
+    r.add_argument("--no-rerank", dest="rerank", action="store_false")
+    r.add_argument("--extractive", action="store_true")
+    r.add_argument("--caches", action="store_true", help="keep the embedding / rerank / answer caches on")
+    r.add_argument("--token-ms", type=float, default=20.0, help="stub LLM time per generated token")
+    r.add_argument("--first-token-ms", type=float, default=50.0)
+    r.add_argument("--prefill-ms-per-token", type=float, default=0.2)
+    r.add_argument("--tokens", type=int, default=40, help="tokens per stub answer")
+    r.add_argument("--workdir", help="where to put the corpus and index (default: a temp dir, removed afterwards)")
+    r.add_argument("--out", help="write the JSON report here instead of stdout")
+    c = sub.add_parser("compare", help="compare two reports; exit 1 on regressions")
+    c.add_argument("base")
+    c.add_argument("new")
+    c.add_argument("--tolerance", type=float, default=0.15, help="allowed relative slowdown")
+    c.add_argument("--min-ms", type=float, default=1.0, help="ignore slowdowns smaller than this")
+    args = ap.parse_args()
+
+    if args.cmd == "compare":
+        with open(args.base, encoding="utf-8") as f:
+            base = json.load(f)
+        with open(args.new, encoding="utf-8") as f:
+            new = json.load(f)
+        if compare(base, new, args.tolerance, args.min_ms):
+            raise SystemExit(1)
+        return
+
+    report = run(args)
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        e2e = report["end_to_end_ms"]
+        print(f"[bench] end-to-end p50 {e2e['p50']} ms, p95 {e2e['p95']} ms, "
+              f"{report['throughput_rps']} req/s -> {args.out}")
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+import time, threading, unicodedata, hashlib
+from collections import OrderedDict
+from typing import Any, Hashable, List, Optional
+import numpy as np
+
+def normalize_question(text: str) -> str:
+    return " ".join(unicodedata.normalize("NFKC", text).casefold().split())
+
+def text_hash(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+
+class LRUCache:
+    """Thread-safe LRU cache with optional TTL (seconds, 0 = no expiry) and hit/miss counters."""
+
+    def __init__(self, maxsize: int, ttl: float = 0.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and self.ttl and time.monotonic() - item[0] > self.ttl:
+                del self._data[key]
+                item = None
+            if item is None:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key: Hashable, value: Any):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.pop(key, None)
+            return default if item is None else item[1]
+
+    def values(self) -> List[Any]:
+        with self._lock:
+            now = time.monotonic()
+            return [v for t, v in self._data.values() if not self.ttl or now - t <= self.ttl]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": (self.hits / total) if total else 0.0,
+            }
+
+class AnswerCache:
+    """Cache of /ask results keyed by (normalized question, lang, top_k).
+
+    With a semantic threshold > 0, a miss falls back to the most similar cached
+    question (cosine over normalized embeddings) for the same lang/top_k.
+    Everything is dropped when the index version changes.
+    """
+
+    def __init__(self, maxsize: int, ttl: float = 0.0, semantic_threshold: float = 0.0):
+        self.entries = LRUCache(maxsize, ttl)
+        self.semantic_threshold = semantic_threshold
+        self.semantic_hits = 0
+        self.invalidations = 0
+        self.version: Optional[str] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(question: str, lang: Optional[str], top_k: int) -> tuple:
+        return (normalize_question(question), lang or "", top_k)
+
+    def sync(self, version: Optional[str]):
+        with self._lock:
+            if version != self.version:
+                if self.version is not None:
+                    self.invalidations += 1
+                self.entries.clear()
+                self.version = version
+
+    def get(self, question: str, lang: Optional[str], top_k: int) -> Optional[dict]:
+        item = self.entries.get(self.key(question, lang, top_k))
+        return None if item is None else item[1]
+
+    def get_similar(self, qvec, lang: Optional[str], top_k: int) -> Optional[dict]:
+        if self.semantic_threshold <= 0 or qvec is None:
+            return None
+        scope = (lang or "", top_k)
+        cands = [(vec, result) for key, result, vec in self.entries.values()
+                 if key[1:] == scope and vec is not None]
+        if not cands:
+            return None
+        sims = np.stack([v for v, _ in cands]) @ np.asarray(qvec, dtype=np.float32)
+        best = int(np.argmax(sims))
+        if sims[best] < self.semantic_threshold:
+            return None
+        with self._lock:
+            self.semantic_hits += 1
+        return cands[best][1]
+
+    def put(self, question: str, lang: Optional[str], top_k: int, result: dict, qvec=None):
+        key = self.key(question, lang, top_k)
+        vec = None if qvec is None else np.asarray(qvec, dtype=np.float32)
+        self.entries.put(key, (key, result, vec))
+
+    def stats(self) -> dict:
+        st = self.entries.stats()
+        st.update(semantic_hits=self.semantic_hits, invalidations=self.invalidations)
+        return st
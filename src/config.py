@@ -21,13 +21,142 @@ QDRANT_URL = os.getenv("QDRANT_URL", "http://localhost:6333")
 QDRANT_COLLECTION = os.getenv("QDRANT_COLLECTION", "htu-web")
 QDRANT_DISTANCE = os.getenv("QDRANT_DISTANCE", "Cosine")
 
+# Default search parameters (overridable per request)
+SEARCH_HNSW_EF = int(os.getenv("SEARCH_HNSW_EF", "0"))  # 0 = server default
+SEARCH_EXACT = os.getenv("SEARCH_EXACT", "false").lower() == "true"
+SEARCH_QUANT_RESCORE = os.getenv("SEARCH_QUANT_RESCORE", "")  # "", "true" or "false"
+SEARCH_QUANT_OVERSAMPLING = float(os.getenv("SEARCH_QUANT_OVERSAMPLING", "0"))  # 0 = server default
+SEARCH_SCORE_THRESHOLD = float(os.getenv("SEARCH_SCORE_THRESHOLD", "0"))  # 0 = no threshold
+SEARCH_PAYLOAD_FIELDS = [f.strip() for f in os.getenv("SEARCH_PAYLOAD_FIELDS", "").split(",") if f.strip()]
+
 # LLM via Ollama
 OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434")
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.1:8b-instruct-q4_K_M")
+# Several Ollama hosts: comma-separated; requests go to the healthy one with the fewest in flight
+# (unset or empty: just OLLAMA_URL)
+OLLAMA_URLS = [u.strip() for u in os.getenv("OLLAMA_URLS", "").split(",") if u.strip()] or [OLLAMA_URL]
+OLLAMA_HEALTH_INTERVAL = float(os.getenv("OLLAMA_HEALTH_INTERVAL", "10"))  # seconds
+OLLAMA_EJECT_AFTER = int(os.getenv("OLLAMA_EJECT_AFTER", "3"))  # consecutive failures
+OLLAMA_PREFER_LOADED = os.getenv("OLLAMA_PREFER_LOADED", "true").lower() == "true"
 MAX_TOKENS = int(os.getenv("MAX_TOKENS", "700"))
 TEMPERATURE = float(os.getenv("TEMPERATURE", "0.2"))
+OLLAMA_ENDPOINT = os.getenv("OLLAMA_ENDPOINT", "auto")  # auto | chat | generate
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")  # how long Ollama keeps the model loaded after a request
+OLLAMA_TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT", "120"))
+OLLAMA_CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "5"))
+OLLAMA_MAX_CONNECTIONS = int(os.getenv("OLLAMA_MAX_CONNECTIONS", "16"))
+# num_ctx fits the largest prompt (CONTEXT_TOKEN_BUDGET + MAX_TOKENS + prompt overhead), rounded up
+# to a multiple of the step; fixed, since Ollama reloads the model whenever num_ctx changes. 0 = server default
+OLLAMA_NUM_CTX_STEP = int(os.getenv("OLLAMA_NUM_CTX_STEP", "1024"))
+OLLAMA_NUM_CTX_MIN = int(os.getenv("OLLAMA_NUM_CTX_MIN", "2048"))
+OLLAMA_NUM_CTX_MAX = int(os.getenv("OLLAMA_NUM_CTX_MAX", "8192"))
+PROMPT_CONTEXT_FIRST = os.getenv("PROMPT_CONTEXT_FIRST", "true").lower() == "true"  # false = old question-first layout
+
+# Prompt context packing
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2000"))
+CONTEXT_TOKENIZER = os.getenv("CONTEXT_TOKENIZER", "")  # HF tokenizer matching OLLAMA_MODEL; empty = estimate
+CONTEXT_CHARS_PER_TOKEN = float(os.getenv("CONTEXT_CHARS_PER_TOKEN", "3.5"))
 
 # Reranker
 ENABLE_RERANKER = os.getenv("ENABLE_RERANKER", "true").lower() == "true"
 RERANKER_MODEL = os.getenv("RERANKER_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANKER_BACKEND = os.getenv("RERANKER_BACKEND", "torch").lower()  # torch | int8 | onnx | overlap
+RERANKER_MAX_LENGTH = int(os.getenv("RERANKER_MAX_LENGTH", "256"))
+RERANKER_BATCH_SIZE = int(os.getenv("RERANKER_BATCH_SIZE", "16"))
+RERANKER_ONNX_DIR = os.getenv("RERANKER_ONNX_DIR", os.path.join(DATA_DIR, "onnx", RERANKER_MODEL.replace("/", "__")))
+RERANKER_PARITY_MIN_SPEARMAN = float(os.getenv("RERANKER_PARITY_MIN_SPEARMAN", "0.95"))
 TOP_K = int(os.getenv("TOP_K", "6"))
+RERANK_CANDIDATE_FACTOR = int(os.getenv("RERANK_CANDIDATE_FACTOR", "3"))
+
+# Adaptive reranking: skip the cross-encoder when dense retrieval is decisive,
+# widen the candidate pool when dense scores are flat
+ADAPTIVE_RERANK = os.getenv("ADAPTIVE_RERANK", "false").lower() == "true"
+ADAPTIVE_SKIP_TOP_SCORE = float(os.getenv("ADAPTIVE_SKIP_TOP_SCORE", "0.75"))
+ADAPTIVE_SKIP_MARGIN = float(os.getenv("ADAPTIVE_SKIP_MARGIN", "0.08"))
+ADAPTIVE_FLAT_SPREAD = float(os.getenv("ADAPTIVE_FLAT_SPREAD", "0.05"))
+ADAPTIVE_MAX_FACTOR = int(os.getenv("ADAPTIVE_MAX_FACTOR", "6"))
+
+# Extractive fast path: answer from the top chunk without the LLM when the reranker is decisive
+# (scores are in the reranker's units; the defaults suit ms-marco cross-encoder logits)
+EXTRACTIVE_ENABLED = os.getenv("EXTRACTIVE_ENABLED", "false").lower() == "true"
+EXTRACTIVE_MIN_SCORE = float(os.getenv("EXTRACTIVE_MIN_SCORE", "7.0"))
+EXTRACTIVE_MIN_MARGIN = float(os.getenv("EXTRACTIVE_MIN_MARGIN", "3.0"))
+EXTRACTIVE_MIN_SENTENCE_SCORE = float(os.getenv("EXTRACTIVE_MIN_SENTENCE_SCORE", "5.0"))
+EXTRACTIVE_SPAN_DELTA = float(os.getenv("EXTRACTIVE_SPAN_DELTA", "1.5"))
+
+# Embedding backend: "torch" (SentenceTransformer), "onnx" (ONNX Runtime, int8) or "hash" (no model; benchmarks)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+EMBEDDING_HASH_DIM = int(os.getenv("EMBEDDING_HASH_DIM", "384"))
+EMBEDDING_POOLING = os.getenv("EMBEDDING_POOLING", "cls").lower()  # bge-m3 uses CLS pooling
+EMBEDDING_MAX_LENGTH = int(os.getenv("EMBEDDING_MAX_LENGTH", "512"))
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", os.path.join(DATA_DIR, "onnx", EMBEDDING_MODEL.replace("/", "__")))
+ONNX_THREADS = int(os.getenv("ONNX_THREADS", "0"))  # 0 = let ONNX Runtime decide
+ONNX_PARITY_MIN_COSINE = float(os.getenv("ONNX_PARITY_MIN_COSINE", "0.99"))
+
+# Vector store: "qdrant" (server) or "local" (in-process, memory-mapped)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "qdrant").lower()
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", os.path.join(DATA_DIR, "local_index"))
+LOCAL_INDEX_HNSW = os.getenv("LOCAL_INDEX_HNSW", "false").lower() == "true"
+LOCAL_HNSW_M = int(os.getenv("LOCAL_HNSW_M", "16"))
+LOCAL_HNSW_EF_CONSTRUCTION = int(os.getenv("LOCAL_HNSW_EF_CONSTRUCTION", "200"))
+LOCAL_HNSW_EF = int(os.getenv("LOCAL_HNSW_EF", "128"))
+
+# Snapshots
+SNAPSHOT_UPLOAD_BATCH = int(os.getenv("SNAPSHOT_UPLOAD_BATCH", "512"))
+SNAPSHOT_UPLOAD_PARALLEL = int(os.getenv("SNAPSHOT_UPLOAD_PARALLEL", "4"))
+
+# Query embedding cache (0 disables)
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "2048"))
+EMBED_CACHE_TTL = float(os.getenv("EMBED_CACHE_TTL", "3600"))
+
+# Cross-encoder score cache, keyed by (question, chunk, content hash, model) (0 disables)
+RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", "20000"))
+RERANK_CACHE_TTL = float(os.getenv("RERANK_CACHE_TTL", "3600"))
+
+# Answer cache for /ask (size 0 disables; threshold 0 disables semantic matching)
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "512"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "900"))
+ANSWER_CACHE_SEMANTIC_THRESHOLD = float(os.getenv("ANSWER_CACHE_SEMANTIC_THRESHOLD", "0"))
+INDEX_VERSION_CHECK_SECONDS = float(os.getenv("INDEX_VERSION_CHECK_SECONDS", "5"))
+
+# Cross-request micro-batching of embedding / reranking calls
+MICROBATCH_ENABLED = os.getenv("MICROBATCH_ENABLED", "false").lower() == "true"
+MICROBATCH_MAX_WAIT_MS = float(os.getenv("MICROBATCH_MAX_WAIT_MS", "5"))
+MICROBATCH_MAX_EMBED = int(os.getenv("MICROBATCH_MAX_EMBED", "32"))
+MICROBATCH_MAX_RERANK_PAIRS = int(os.getenv("MICROBATCH_MAX_RERANK_PAIRS", "128"))
+
+# Async request path: threads dedicated to embedding / reranking
+MODEL_WORKERS = int(os.getenv("MODEL_WORKERS", "2"))
+
+# /ask/batch
+BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", "500"))
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "2"))
+
+# LLM admission control: generations in flight, then a bounded priority queue (0 = unlimited)
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "4"))
+LLM_QUEUE_SIZE = int(os.getenv("LLM_QUEUE_SIZE", "16"))
+LLM_QUEUE_MAX_WAIT = float(os.getenv("LLM_QUEUE_MAX_WAIT", "20"))  # seconds
+
+# Request deadlines (0 = none): stages cut back to answer before the deadline
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "60"))  # when the client sends none
+REQUEST_DEADLINE_MAX_SECONDS = float(os.getenv("REQUEST_DEADLINE_MAX_SECONDS", "300"))  # caps any deadline
+DEADLINE_SAFETY_SECONDS = float(os.getenv("DEADLINE_SAFETY_SECONDS", "0.5"))
+DEADLINE_MIN_RERANK_SECONDS = float(os.getenv("DEADLINE_MIN_RERANK_SECONDS", "3"))
+DEADLINE_PREFILL_TOKENS_PER_SECOND = float(os.getenv("DEADLINE_PREFILL_TOKENS_PER_SECOND", "300"))  # rough LLM speeds
+DEADLINE_DECODE_TOKENS_PER_SECOND = float(os.getenv("DEADLINE_DECODE_TOKENS_PER_SECOND", "15"))
+DEADLINE_MIN_TOKENS = int(os.getenv("DEADLINE_MIN_TOKENS", "32"))  # don't start a generation with less room
+DEADLINE_MIN_CONTEXT_TOKENS = int(os.getenv("DEADLINE_MIN_CONTEXT_TOKENS", "256"))
+
+# Prometheus metrics at GET /metrics
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+# Sampling profiles of single requests (off by default): X-Profile header or a random sample
+PROFILE_ENABLED = os.getenv("PROFILE_ENABLED", "false").lower() == "true"
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))  # fraction of requests, 0..1
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_MAX_CONCURRENT = int(os.getenv("PROFILE_MAX_CONCURRENT", "1"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(DATA_DIR, "profiles"))
+
+# Startup: models load in the background; /readyz reports when they are done
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+OLLAMA_PRELOAD = os.getenv("OLLAMA_PRELOAD", "true").lower() == "true"
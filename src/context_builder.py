@@ -0,0 +1,90 @@
+"""Prompt context assembly under a token budget.
+
+Retrieved chunks are grouped by URL (citation numbers follow first appearance
+in the ranking, so `[i]` always matches `sources[i-1]`). Chunks of one page are
+ordered by chunk index, and the overlap the chunker stitches between
+neighbours is cut so shared text only appears once. Sections are then added
+until CONTEXT_TOKEN_BUDGET is spent, counting with the LLM's tokenizer when
+CONTEXT_TOKENIZER names one and with a chars-per-token estimate otherwise.
+"""
+import re
+from functools import lru_cache
+from typing import Callable, Dict, List, Tuple
+
+try:
+    from .config import CONTEXT_TOKEN_BUDGET, CONTEXT_TOKENIZER, CONTEXT_CHARS_PER_TOKEN
+except ImportError:
+    from config import CONTEXT_TOKEN_BUDGET, CONTEXT_TOKENIZER, CONTEXT_CHARS_PER_TOKEN
+
+MAX_OVERLAP = 400  # chunker overlap is 150 chars; leave room for other settings
+MIN_OVERLAP = 20
+MIN_SECTION_TOKENS = 48  # don't add a section we would have to cut to a stub
+
+_CHUNK_RE = re.compile(r"#chunk=(\d+)$")
+
+@lru_cache(maxsize=None)  # the retriever and the Ollama client share one tokenizer
+def load_token_counter(name: str = CONTEXT_TOKENIZER) -> Callable[[str], int]:
+    if name:
+        from transformers import AutoTokenizer
+        tok = AutoTokenizer.from_pretrained(name)
+        return lambda text: len(tok.encode(text, add_special_tokens=False))
+    return lambda text: int(len(text) / CONTEXT_CHARS_PER_TOKEN) + 1
+
+def _chunk_index(doc: Dict) -> int:
+    m = _CHUNK_RE.search(doc.get("id") or "")
+    return int(m.group(1)) if m else -1
+
+def _overlap(a: str, b: str) -> int:
+    """Length of the longest suffix of `a` that is a prefix of `b`."""
+    for k in range(min(len(a), len(b), MAX_OVERLAP), MIN_OVERLAP - 1, -1):
+        if a.endswith(b[:k]):
+            return k
+    return 0
+
+def merge_chunks(docs: List[Dict]) -> str:
+    docs = sorted(docs, key=_chunk_index)
+    text, prev_idx = "", None
+    for d in docs:
+        content = d["content"].strip()
+        if not text:
+            text = content
+        else:
+            cut = _overlap(text, content)
+            rest = content[cut:].lstrip()
+            adjacent = prev_idx is not None and _chunk_index(d) == prev_idx + 1
+            text += (" " if adjacent or cut else " … ") + rest
+        prev_idx = _chunk_index(d)
+    return text
+
+def _fit(text: str, budget: int, count: Callable[[str], int]) -> str:
+    if count(text) <= budget:
+        return text
+    lo, hi = 0, len(text)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if count(text[:mid] + " …") <= budget:
+            lo = mid
+        else:
+            hi = mid - 1
+    return text[:lo].rstrip() + " …"
+
+def build_context(docs: List[Dict], count: Callable[[str], int],
+                  budget: int = CONTEXT_TOKEN_BUDGET) -> Tuple[str, List[Dict]]:
+    """Returns the prompt context and the cited docs (one per URL, in citation order)."""
+    groups: Dict[str, List[Dict]] = {}
+    for d in docs:
+        groups.setdefault(d["url"], []).append(d)
+
+    context, cited, used = "", [], 0
+    for url, group in groups.items():
+        header = f"\n[{len(cited) + 1}] {url}\n"
+        body = merge_chunks(group).replace("\n", " ")
+        remaining = budget - used - count(header)
+        if remaining < MIN_SECTION_TOKENS:
+            break
+        body = _fit(body, remaining, count)
+        section = f"{header}{body}\n"
+        context += section
+        used += count(header) + count(body)
+        cited.append(group[0])
+    return context, cited
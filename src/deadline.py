@@ -0,0 +1,103 @@
+"""Per-request time budgets.
+
+A `Deadline` is created when a request arrives (the client's `deadline_ms`, or
+REQUEST_DEADLINE_SECONDS) and passed down through retrieval, reranking and
+generation. Each stage asks it what it can still afford:
+
+  rerank        skipped when less than DEADLINE_MIN_RERANK_SECONDS remain
+  context       shrunk to what can be prefilled in the time left
+  num_predict   capped to what can be decoded in the time left
+  generation    cut off at the deadline; the text so far is returned as partial
+
+Stages that had to cut back record it in `degraded`, which is reported with
+the answer. DEADLINE_SAFETY_SECONDS is kept in reserve so the response gets
+out before the client gives up.
+"""
+import math, time
+from typing import List, Optional
+
+try:
+    from .config import (
+        REQUEST_DEADLINE_SECONDS, REQUEST_DEADLINE_MAX_SECONDS, DEADLINE_SAFETY_SECONDS,
+        DEADLINE_MIN_RERANK_SECONDS, DEADLINE_PREFILL_TOKENS_PER_SECOND, DEADLINE_DECODE_TOKENS_PER_SECOND,
+        DEADLINE_MIN_TOKENS, DEADLINE_MIN_CONTEXT_TOKENS
+    )
+except ImportError:
+    from config import (
+        REQUEST_DEADLINE_SECONDS, REQUEST_DEADLINE_MAX_SECONDS, DEADLINE_SAFETY_SECONDS,
+        DEADLINE_MIN_RERANK_SECONDS, DEADLINE_PREFILL_TOKENS_PER_SECOND, DEADLINE_DECODE_TOKENS_PER_SECOND,
+        DEADLINE_MIN_TOKENS, DEADLINE_MIN_CONTEXT_TOKENS
+    )
+
+class DeadlineExceeded(Exception):
+    """Raised when generation is cut off; `partial` is the text produced before the deadline."""
+
+    def __init__(self, partial: str = ""):
+        super().__init__("request deadline exceeded")
+        self.partial = partial
+
+class Deadline:
+    __slots__ = ("budget", "start", "end", "degraded")
+
+    def __init__(self, seconds: Optional[float] = None):
+        self.budget = seconds if seconds and seconds > 0 else None
+        self.start = time.monotonic()
+        self.end = self.start + self.budget if self.budget else None
+        self.degraded: List[str] = []
+
+    @classmethod
+    def from_request(cls, deadline_ms: Optional[int] = None) -> "Deadline":
+        seconds = deadline_ms / 1000 if deadline_ms else REQUEST_DEADLINE_SECONDS
+        # No deadline stays none (REQUEST_DEADLINE_SECONDS=0); the cap only shortens one
+        if seconds and REQUEST_DEADLINE_MAX_SECONDS > 0:
+            seconds = min(seconds, REQUEST_DEADLINE_MAX_SECONDS)
+        return cls(seconds)
+
+    def remaining(self) -> float:
+        """Usable seconds left (the safety margin is already taken off)."""
+        if self.end is None:
+            return math.inf
+        return max(0.0, self.end - time.monotonic() - DEADLINE_SAFETY_SECONDS)
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def timeout(self, default: float) -> float:
+        return max(0.001, min(default, self.remaining()))
+
+    def note(self, what: str):
+        if what not in self.degraded:
+            self.degraded.append(what)
+
+    def complete(self) -> bool:
+        """False if the answer may be worse than an unhurried one (and should not be cached)."""
+        # A capped num_predict only matters if the generation actually ran into it ("truncated")
+        return not [d for d in self.degraded if d != "num_predict_capped"]
+
+    def allows_rerank(self) -> bool:
+        if self.remaining() >= DEADLINE_MIN_RERANK_SECONDS:
+            return True
+        self.note("rerank_skipped")
+        return False
+
+    def context_budget(self, full: int) -> int:
+        # Leave time to decode at least DEADLINE_MIN_TOKENS after the prefill
+        t = self.remaining() - DEADLINE_MIN_TOKENS / DEADLINE_DECODE_TOKENS_PER_SECOND
+        if t * DEADLINE_PREFILL_TOKENS_PER_SECOND >= full:
+            return full
+        self.note("context_shrunk")
+        return max(DEADLINE_MIN_CONTEXT_TOKENS, int(t * DEADLINE_PREFILL_TOKENS_PER_SECOND))
+
+    def max_tokens(self, prompt_tokens: int, full: int) -> int:
+        t = self.remaining() - prompt_tokens / DEADLINE_PREFILL_TOKENS_PER_SECOND
+        if t * DEADLINE_DECODE_TOKENS_PER_SECOND >= full:
+            return full
+        self.note("num_predict_capped")
+        return max(0, int(t * DEADLINE_DECODE_TOKENS_PER_SECOND))
+
+    def as_dict(self) -> dict:
+        return {
+            "budget_ms": round(self.budget * 1000) if self.budget else None,
+            "elapsed_ms": round((time.monotonic() - self.start) * 1000, 1),
+            "degraded": list(self.degraded),
+        }
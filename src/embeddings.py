@@ -0,0 +1,199 @@
+"""Embedding backends shared by the indexer and the retriever.
+
+Backends expose `encode(texts) -> np.ndarray` (L2-normalized, float32) and
+`dim`. Select one with EMBEDDING_BACKEND:
+
+  torch  SentenceTransformer fp32 (default)
+  onnx   exported ONNX model with dynamic int8 quantization, run on ONNX Runtime
+  hash   hashed bag of words, no model at all (offline benchmarks; retrieval quality is poor)
+
+Export / check the ONNX model:
+
+  python -m src.embeddings export
+  python -m src.embeddings parity "What are the admission requirements?" ...
+"""
+import os, re, sys, time, json, zlib
+from typing import List
+import numpy as np
+
+try:
+    from .config import (
+        EMBEDDING_MODEL, EMBEDDING_BACKEND, EMBEDDING_POOLING, EMBEDDING_MAX_LENGTH,
+        ONNX_MODEL_DIR, ONNX_THREADS, ONNX_PARITY_MIN_COSINE, EMBEDDING_HASH_DIM
+    )
+except ImportError:
+    from config import (
+        EMBEDDING_MODEL, EMBEDDING_BACKEND, EMBEDDING_POOLING, EMBEDDING_MAX_LENGTH,
+        ONNX_MODEL_DIR, ONNX_THREADS, ONNX_PARITY_MIN_COSINE, EMBEDDING_HASH_DIM
+    )
+
+FP32_FILE = "model.onnx"
+INT8_FILE = "model.int8.onnx"
+
+def _normalize(x: np.ndarray) -> np.ndarray:
+    x = np.asarray(x, dtype=np.float32)
+    n = np.linalg.norm(x, axis=1, keepdims=True)
+    return x / np.clip(n, 1e-12, None)
+
+class TorchEmbedder:
+    backend = "torch"
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL):
+        from sentence_transformers import SentenceTransformer
+        self.model_name = model_name
+        self.model = SentenceTransformer(model_name)
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        vecs = self.model.encode(texts, batch_size=batch_size, normalize_embeddings=True)
+        return np.asarray(vecs, dtype=np.float32)
+
+class OnnxEmbedder:
+    backend = "onnx"
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL, model_dir: str = ONNX_MODEL_DIR,
+                 pooling: str = EMBEDDING_POOLING, max_length: int = EMBEDDING_MAX_LENGTH):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+        path = os.path.join(model_dir, INT8_FILE)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Missing ONNX model: {path}. Run `python -m src.embeddings export` first.")
+        self.model_name = model_name
+        self.pooling = pooling
+        self.max_length = max_length
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if ONNX_THREADS > 0:
+            opts.intra_op_num_threads = ONNX_THREADS
+        self.session = ort.InferenceSession(path, sess_options=opts, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        with open(os.path.join(model_dir, "embedding_config.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta["model"] != model_name:
+            raise ValueError(f"ONNX model in {model_dir} was exported from {meta['model']}, not {model_name}.")
+        self.dim = meta["dim"]
+
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        out = []
+        for i in range(0, len(texts), batch_size):
+            toks = self.tokenizer(texts[i:i+batch_size], padding=True, truncation=True,
+                                  max_length=self.max_length, return_tensors="np")
+            feed = {k: v.astype(np.int64) for k, v in toks.items() if k in self.input_names}
+            hidden = self.session.run(None, feed)[0]
+            out.append(_pool(hidden, toks["attention_mask"], self.pooling))
+        if not out:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return _normalize(np.concatenate(out))
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+class HashEmbedder:
+    """Feature-hashed word counts: deterministic and fast, for runs without model weights."""
+    backend = "hash"
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL, dim: int = EMBEDDING_HASH_DIM):
+        self.model_name = model_name
+        self.dim = dim
+
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, t in enumerate(texts):
+            for w in _WORD_RE.findall(t.lower()):
+                h = zlib.crc32(w.encode("utf-8"))
+                out[i, h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        return _normalize(out)
+
+def _pool(hidden: np.ndarray, mask: np.ndarray, pooling: str) -> np.ndarray:
+    if pooling == "cls":
+        return hidden[:, 0]
+    m = mask[..., None].astype(np.float32)
+    return (hidden * m).sum(axis=1) / np.clip(m.sum(axis=1), 1e-9, None)
+
+def load_embedder(backend: str = EMBEDDING_BACKEND, model_name: str = EMBEDDING_MODEL):
+    if backend == "onnx":
+        return OnnxEmbedder(model_name)
+    if backend == "torch":
+        return TorchEmbedder(model_name)
+    if backend == "hash":
+        return HashEmbedder(model_name)
+    raise ValueError(f"Unknown EMBEDDING_BACKEND: {backend}")
+
+def export_onnx(model_name: str = EMBEDDING_MODEL, model_dir: str = ONNX_MODEL_DIR):
+    """Export the transformer to ONNX and write a dynamically int8-quantized copy."""
+    import torch
+    from transformers import AutoTokenizer, AutoModel
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    os.makedirs(model_dir, exist_ok=True)
+    print(f"[embeddings] Exporting {model_name} -> {model_dir}")
+    tok = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name).eval()
+    tok.save_pretrained(model_dir)
+
+    sample = tok(["export sample"], return_tensors="pt")
+    names = ["input_ids", "attention_mask"]
+    axes = {n: {0: "batch", 1: "seq"} for n in names}
+    axes["last_hidden_state"] = {0: "batch", 1: "seq"}
+    fp32 = os.path.join(model_dir, FP32_FILE)
+    with torch.no_grad():
+        torch.onnx.export(
+            model, (sample["input_ids"], sample["attention_mask"]), fp32,
+            input_names=names, output_names=["last_hidden_state"],
+            dynamic_axes=axes, opset_version=17,
+        )
+    # bge-m3 is above the 2 GB protobuf limit, so keep weights as external data
+    int8 = os.path.join(model_dir, INT8_FILE)
+    quantize_dynamic(fp32, int8, weight_type=QuantType.QInt8, use_external_data_format=True)
+    with open(os.path.join(model_dir, "embedding_config.json"), "w", encoding="utf-8") as f:
+        json.dump({"model": model_name, "dim": model.config.hidden_size,
+                   "pooling": EMBEDDING_POOLING, "max_length": EMBEDDING_MAX_LENGTH}, f, indent=2)
+    print(f"[embeddings] Wrote {int8}")
+
+def _timed_encode(embedder, texts: List[str], repeat: int) -> float:
+    embedder.encode(texts[:1])  # warmup
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        for t in texts:
+            embedder.encode([t])
+    return (time.perf_counter() - t0) * 1000 / (repeat * len(texts))
+
+def parity(texts: List[str], min_cosine: float = ONNX_PARITY_MIN_COSINE, repeat: int = 3) -> dict:
+    """Compare int8 ONNX vectors against the PyTorch reference and time single-query encoding."""
+    ref, onnx = TorchEmbedder(), OnnxEmbedder()
+    a, b = ref.encode(texts), onnx.encode(texts)
+    cos = (a * b).sum(axis=1)
+    report = {
+        "n": len(texts),
+        "min_cosine": float(cos.min()),
+        "mean_cosine": float(cos.mean()),
+        "threshold": min_cosine,
+        "ok": bool(cos.min() >= min_cosine),
+        "torch_ms_per_query": _timed_encode(ref, texts, repeat),
+        "onnx_ms_per_query": _timed_encode(onnx, texts, repeat),
+    }
+    report["speedup"] = report["torch_ms_per_query"] / max(report["onnx_ms_per_query"], 1e-9)
+    return report
+
+DEFAULT_PARITY_TEXTS = [
+    "What are the admission requirements?",
+    "What programs does HTU offer?",
+    "How do I contact the registration office?",
+    "ما هي شروط القبول في الجامعة؟",
+    "ما هي البرامج التي تقدمها جامعة الحسين التقنية؟",
+]
+
+if __name__ == "__main__":
+    cmd = sys.argv[1] if len(sys.argv) > 1 else ""
+    if cmd == "export":
+        export_onnx()
+    elif cmd == "parity":
+        try:
+            rep = parity(sys.argv[2:] or DEFAULT_PARITY_TEXTS)
+        except (FileNotFoundError, ValueError) as e:
+            raise SystemExit(str(e))
+        print(json.dumps(rep, indent=2))
+        if not rep["ok"]:
+            raise SystemExit(f"[embeddings] Parity check failed: min cosine {rep['min_cosine']:.4f} < {rep['threshold']}")
+    else:
+        raise SystemExit("usage: python -m src.embeddings export | parity [text ...]")
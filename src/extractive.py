@@ -0,0 +1,65 @@
+"""Extractive answers for high-confidence lookups.
+
+When the reranker is decisive about the best chunk (score at least
+EXTRACTIVE_MIN_SCORE and ahead of the runner-up by EXTRACTIVE_MIN_MARGIN), the
+answer is very likely stated verbatim in it: phone numbers, addresses,
+deadlines. Instead of a full LLM generation, the chunk's sentences are scored
+against the question with the same cross-encoder and the best one (plus a
+neighbour that scores almost as well) is returned with a citation. Anything
+less clear-cut goes to the LLM as before.
+"""
+import re
+from typing import Callable, Dict, List, Optional, Tuple
+
+try:
+    from .config import (
+        EXTRACTIVE_MIN_SCORE, EXTRACTIVE_MIN_MARGIN, EXTRACTIVE_MIN_SENTENCE_SCORE, EXTRACTIVE_SPAN_DELTA
+    )
+except ImportError:
+    from config import (
+        EXTRACTIVE_MIN_SCORE, EXTRACTIVE_MIN_MARGIN, EXTRACTIVE_MIN_SENTENCE_SCORE, EXTRACTIVE_SPAN_DELTA
+    )
+
+MIN_SENTENCE_CHARS = 12
+MAX_SENTENCE_CHARS = 400
+
+# Sentence ends in English and Arabic (؟ question mark, ۔ full stop), or line breaks
+_SPLIT_RE = re.compile(r"(?<=[.!?؟۔])\s+|\s*\n+\s*")
+
+def split_sentences(text: str) -> List[str]:
+    out, pending = [], ""
+    for s in _SPLIT_RE.split(text):
+        s = (pending + s).strip()
+        if len(s) < MIN_SENTENCE_CHARS:
+            pending = s + " " if s else ""  # fragments like "Tel." belong to what follows
+            continue
+        pending = ""
+        out.append(s[:MAX_SENTENCE_CHARS])
+    if pending.strip():
+        if out:
+            out[-1] += " " + pending.strip()
+        else:
+            out.append(pending.strip())
+    return out
+
+def is_confident(top_scores: List[float]) -> bool:
+    if not top_scores or top_scores[0] < EXTRACTIVE_MIN_SCORE:
+        return False
+    return len(top_scores) == 1 or top_scores[0] - top_scores[1] >= EXTRACTIVE_MIN_MARGIN
+
+def extract(question: str, doc: Dict, score: Callable[[List[Tuple[str, str]]], List[float]]) -> Optional[str]:
+    """The best-matching span of `doc` cited as [1], or None if no sentence is convincing."""
+    sents = split_sentences(doc["content"])
+    if not sents:
+        return None
+    scores = [float(s) for s in score([(question, s) for s in sents])]
+    best = max(range(len(sents)), key=scores.__getitem__)
+    if scores[best] < EXTRACTIVE_MIN_SENTENCE_SCORE:
+        return None
+    span = [best]
+    # One neighbour that is nearly as relevant usually completes the fact
+    near = [i for i in (best - 1, best + 1) if 0 <= i < len(sents)]
+    near = [i for i in near if scores[i] >= scores[best] - EXTRACTIVE_SPAN_DELTA]
+    if near:
+        span.append(max(near, key=scores.__getitem__))
+    return " ".join(sents[i] for i in sorted(span)) + " [1]"
@@ -1,13 +1,27 @@
-import os, json
+import os, json, argparse
 from typing import List, Dict
-from sentence_transformers import SentenceTransformer
-from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct
+import numpy as np
 
 try:
-    from .config import EMBEDDING_MODEL, QDRANT_URL, QDRANT_COLLECTION, OUTPUT_JSONL
+    from .config import (
+        EMBEDDING_MODEL, EMBEDDING_BACKEND, QDRANT_URL, QDRANT_COLLECTION, OUTPUT_JSONL,
+        VECTOR_BACKEND, LOCAL_INDEX_DIR, LOCAL_INDEX_HNSW
+    )
+    from .embeddings import load_embedder
+    from .cache import text_hash
+    from .vector_store import write_local_index, store_qdrant_manifest
+    from .snapshot import corpus_hash, make_manifest, export_snapshot, import_snapshot
 except ImportError:
-    from config import EMBEDDING_MODEL, QDRANT_URL, QDRANT_COLLECTION, OUTPUT_JSONL
+    from config import (
+        EMBEDDING_MODEL, EMBEDDING_BACKEND, QDRANT_URL, QDRANT_COLLECTION, OUTPUT_JSONL,
+        VECTOR_BACKEND, LOCAL_INDEX_DIR, LOCAL_INDEX_HNSW
+    )
+    from embeddings import load_embedder
+    from cache import text_hash
+    from vector_store import write_local_index, store_qdrant_manifest
+    from snapshot import corpus_hash, make_manifest, export_snapshot, import_snapshot
+
+B = 256
 
 def load_rows(path: str) -> List[Dict]:
     rows = []
@@ -16,37 +30,82 @@ def load_rows(path: str) -> List[Dict]:
             rows.append(json.loads(line))
     return rows
 
-def main():
-    if not os.path.exists(OUTPUT_JSONL):
-        raise SystemExit(f"Missing corpus: {OUTPUT_JSONL}. Run crawler first.")
-
-    print(f"[indexer] Loading embedding model: {EMBEDDING_MODEL}")
-    embedder = SentenceTransformer(EMBEDDING_MODEL)
-    dim = embedder.get_sentence_embedding_dimension()
-    print(f"[indexer] Embedding dim: {dim}")
-
+def qdrant_client():
+    from qdrant_client import QdrantClient
     print(f"[indexer] Connecting Qdrant at {QDRANT_URL}")
-    client = QdrantClient(QDRANT_URL)
+    return QdrantClient(QDRANT_URL)
+
+def index_qdrant(embedder, rows: List[Dict], corpus_sha: str, client=None):
+    from qdrant_client.models import Distance, VectorParams, PointStruct
+    client = client if client is not None else qdrant_client()
 
     client.recreate_collection(
         collection_name=QDRANT_COLLECTION,
-        vectors_config=VectorParams(size=dim, distance=Distance.COSINE),
+        vectors_config=VectorParams(size=embedder.dim, distance=Distance.COSINE),
     )
 
-    rows = load_rows(OUTPUT_JSONL)
-    print(f"[indexer] Rows: {len(rows)}")
-
-    B = 256
     pid = 0
     for i in range(0, len(rows), B):
         batch = rows[i:i+B]
-        vecs = embedder.encode([r["content"] for r in batch], normalize_embeddings=True).tolist()
+        vecs = embedder.encode([r["content"] for r in batch]).tolist()
         points = []
         for r, v in zip(batch, vecs):
             points.append(PointStruct(id=pid, vector=v, payload=r))
             pid += 1
         client.upsert(collection_name=QDRANT_COLLECTION, points=points)
         print(f"[indexer] Upserted {i+len(batch)}/{len(rows)}")
+    store_qdrant_manifest(client, make_manifest(embedder.dim, len(rows), corpus_sha))
+
+def index_local(embedder, rows: List[Dict], corpus_sha: str, path: str = LOCAL_INDEX_DIR,
+                hnsw: bool = LOCAL_INDEX_HNSW):
+    vecs = np.zeros((len(rows), embedder.dim), dtype=np.float32)
+    for i in range(0, len(rows), B):
+        batch = rows[i:i+B]
+        vecs[i:i+len(batch)] = embedder.encode([r["content"] for r in batch])
+        print(f"[indexer] Embedded {i+len(batch)}/{len(rows)}")
+    meta = write_local_index(path, vecs, rows, hnsw=hnsw,
+                             manifest=make_manifest(embedder.dim, len(rows), corpus_sha))
+    print(f"[indexer] Wrote local index to {path} (hnsw={meta['hnsw']})")
+
+def main():
+    ap = argparse.ArgumentParser(description="Embed the corpus and build the vector index.")
+    ap.add_argument("--backend", choices=["qdrant", "local"], default=VECTOR_BACKEND)
+    ap.add_argument("--hnsw", action="store_true", default=LOCAL_INDEX_HNSW,
+                    help="also build an HNSW graph for the local index (needs hnswlib)")
+    ap.add_argument("--export-snapshot", metavar="DIR",
+                    help="dump the Qdrant collection (vectors + payloads + manifest) to DIR and exit")
+    ap.add_argument("--import-snapshot", metavar="DIR",
+                    help="bulk-load a snapshot from DIR into a fresh Qdrant collection and exit")
+    args = ap.parse_args()
+
+    if args.export_snapshot:
+        export_snapshot(qdrant_client(), args.export_snapshot)
+        return
+    if args.import_snapshot:
+        import_snapshot(qdrant_client(), args.import_snapshot)
+        return
+
+    if not os.path.exists(OUTPUT_JSONL):
+        raise SystemExit(f"Missing corpus: {OUTPUT_JSONL}. Run crawler first.")
+
+    print(f"[indexer] Loading embedding model: {EMBEDDING_MODEL} ({EMBEDDING_BACKEND})")
+    try:
+        embedder = load_embedder()
+    except (FileNotFoundError, ValueError) as e:
+        raise SystemExit(str(e))
+    print(f"[indexer] Embedding dim: {embedder.dim}")
+
+    rows = load_rows(OUTPUT_JSONL)
+    for r in rows:
+        # lets the reranker score cache notice changed chunks without re-hashing per query
+        r["content_hash"] = text_hash(r["content"])
+    sha = corpus_hash(OUTPUT_JSONL)
+    print(f"[indexer] Rows: {len(rows)}")
+
+    if args.backend == "local":
+        index_local(embedder, rows, sha, hnsw=args.hnsw)
+    else:
+        index_qdrant(embedder, rows, sha)
     print("[indexer] Done.")
 
 if __name__ == "__main__":
@@ -0,0 +1,211 @@
+"""Prometheus metrics, served by the API at GET /metrics.
+
+  rag_stage_seconds{stage}                    embed, search, rerank, context, extract, llm
+  rag_request_seconds{endpoint}               ask, stream, batch (end to end)
+  rag_requests_total{endpoint,lang,status}    status: ok, cached, extractive, degraded, timeout,
+                                              rejected (admission), error, cancelled
+  rag_requests_in_flight{endpoint}
+  rag_llm_ttft_seconds                        first streamed token, from the start of the request
+
+plus, read from the existing stats at scrape time: cache hits / misses / hit
+ratio per cache, LLM admission slots and queue depth, and outstanding
+generations per Ollama host, and per micro-batcher (embed, rerank) the
+batches run, items, mean batch size and queued requests. Label values come from fixed sets (`lang` is
+en, ar, any or other), so the number of series stays bounded.
+
+Every uvicorn worker keeps its own registry; scrape each worker, or run one.
+METRICS_ENABLED=false turns all of this into no-ops (and /metrics into a 404).
+`timings()` collects the stage times of one call regardless (benchmark.py).
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional
+
+try:
+    from .config import METRICS_ENABLED
+    from .admission import Saturated
+except ImportError:
+    from config import METRICS_ENABLED
+    from admission import Saturated
+
+if METRICS_ENABLED:
+    from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+    from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+LANGS = ("en", "ar")
+STAGE_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60)
+REQUEST_BUCKETS = (.01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+if METRICS_ENABLED:
+    STAGE_SECONDS = Histogram("rag_stage_seconds", "Time spent in each stage of answering",
+                              ["stage"], buckets=STAGE_BUCKETS)
+    REQUEST_SECONDS = Histogram("rag_request_seconds", "End-to-end request time",
+                                ["endpoint"], buckets=REQUEST_BUCKETS)
+    REQUESTS = Counter("rag_requests", "Requests by outcome", ["endpoint", "lang", "status"])
+    IN_FLIGHT = Gauge("rag_requests_in_flight", "Requests being answered", ["endpoint"])
+    TTFT_SECONDS = Histogram("rag_llm_ttft_seconds", "Time to the first streamed token",
+                             buckets=REQUEST_BUCKETS)
+
+def content_type() -> str:
+    return CONTENT_TYPE_LATEST
+
+def render() -> bytes:
+    return generate_latest(REGISTRY)
+
+def _lang(lang: Optional[str]) -> str:
+    if not lang:
+        return "any"
+    return lang if lang in LANGS else "other"
+
+def status_of(res: dict) -> str:
+    """Outcome label for an answer dict."""
+    if res.get("cached"):
+        return "cached"
+    if res.get("path") == "timeout":
+        return "timeout"
+    if res.get("degraded"):
+        return "degraded"
+    if res.get("path") == "extractive":
+        return "extractive"
+    return "ok"
+
+# Set by `timings()`; stages add their seconds to it
+_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("rag_stage_timings", default=None)
+
+@contextmanager
+def timings():
+    """Yields a dict that collects {stage: seconds} for stages run in this thread / task."""
+    t = {}
+    token = _timings.set(t)
+    try:
+        yield t
+    finally:
+        _timings.reset(token)
+
+def observe(stage: str, seconds: float):
+    t = _timings.get()
+    if t is not None:
+        t[stage] = t.get(stage, 0.0) + seconds
+    if METRICS_ENABLED:
+        STAGE_SECONDS.labels(stage).observe(seconds)
+
+@contextmanager
+def stage(name: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - t0)
+
+def ttft(seconds: float):
+    if METRICS_ENABLED:
+        TTFT_SECONDS.observe(seconds)
+
+def count(endpoint: str, lang: Optional[str], status: str):
+    if METRICS_ENABLED:
+        REQUESTS.labels(endpoint, _lang(lang), status).inc()
+
+class _Request:
+    __slots__ = ("status",)
+
+    def __init__(self):
+        self.status = "ok"
+
+    def done(self, res: dict) -> dict:
+        self.status = status_of(res)
+        return res
+
+@contextmanager
+def request(endpoint: str, lang: Optional[str]):
+    """Times and counts one request; set `.status`, or pass the answer through `.done(res)`."""
+    req = _Request()
+    if not METRICS_ENABLED:
+        yield req
+        return
+    IN_FLIGHT.labels(endpoint).inc()
+    t0 = time.perf_counter()
+    try:
+        yield req
+    except Exception as e:
+        req.status = "rejected" if isinstance(e, Saturated) else "error"
+        raise
+    except BaseException:
+        req.status = "cancelled"  # client disconnected (task cancelled, stream closed)
+        raise
+    finally:
+        IN_FLIGHT.labels(endpoint).dec()
+        REQUEST_SECONDS.labels(endpoint).observe(time.perf_counter() - t0)
+        count(endpoint, lang, req.status)
+
+class _StatsCollector:
+    """Turns the service's stats() dicts into gauges and counters at scrape time."""
+
+    def __init__(self, sources: Dict[str, Callable[[], dict]]):
+        self.sources = sources
+
+    def describe(self):
+        return []  # otherwise registering would read every source once, at import time
+
+    def _read(self, name: str) -> dict:
+        try:
+            return self.sources[name]() if name in self.sources else {}
+        except Exception as e:
+            print(f"[metrics] {name} stats failed: {e!r}")
+            return {}
+
+    def collect(self):
+        caches = self._read("caches")
+        hits = CounterMetricFamily("rag_cache_hits", "Cache hits", labels=["cache"])
+        misses = CounterMetricFamily("rag_cache_misses", "Cache misses", labels=["cache"])
+        ratio = GaugeMetricFamily("rag_cache_hit_ratio", "Cache hit ratio since start", labels=["cache"])
+        size = GaugeMetricFamily("rag_cache_entries", "Entries in the cache", labels=["cache"])
+        for name, st in caches.items():
+            hits.add_metric([name], st["hits"])
+            misses.add_metric([name], st["misses"])
+            ratio.add_metric([name], st["hit_ratio"])
+            size.add_metric([name], st["size"])
+        yield from (hits, misses, ratio, size)
+
+        adm = self._read("admission")
+        if adm:
+            yield GaugeMetricFamily("rag_llm_active", "Generations holding a slot", value=adm["active"])
+            yield GaugeMetricFamily("rag_llm_slots", "Generation slots (0 = unlimited)", value=adm["limit"])
+            depth = GaugeMetricFamily("rag_llm_queue_depth", "Requests waiting for a slot", labels=["priority"])
+            for p, n in adm["queue_depth_by_priority"].items():
+                depth.add_metric([p], n)
+            yield depth
+            rejected = CounterMetricFamily("rag_llm_rejected", "Requests refused a slot", labels=["reason"])
+            rejected.add_metric(["queue_full"], adm["rejected"])
+            rejected.add_metric(["timeout"], adm["timeouts"])
+            yield rejected
+
+        llm = self._read("llm")
+        if llm.get("backends"):
+            out = GaugeMetricFamily("rag_ollama_outstanding", "Generations in flight per host", labels=["backend"])
+            up = GaugeMetricFamily("rag_ollama_healthy", "1 if the host passes health checks", labels=["backend"])
+            for b in llm["backends"]:
+                out.add_metric([b["url"]], b["outstanding"])
+                up.add_metric([b["url"]], 1 if b["healthy"] else 0)
+            yield from (out, up)
+        batchers = self._read("batchers")
+        if batchers:
+            batches = CounterMetricFamily("rag_batcher_batches", "Forward passes run", labels=["batcher"])
+            items = CounterMetricFamily("rag_batcher_items", "Items over all batches", labels=["batcher"])
+            mean = GaugeMetricFamily("rag_batcher_mean_size", "Mean items per batch", labels=["batcher"])
+            pending = GaugeMetricFamily("rag_batcher_pending", "Requests waiting for a batch", labels=["batcher"])
+            for name, st in batchers.items():
+                batches.add_metric([name], st["batches"])
+                items.add_metric([name], st["items"])
+                mean.add_metric([name], st["mean_batch"])
+                pending.add_metric([name], st["pending"])
+            yield from (batches, items, mean, pending)
+
+        if llm:
+            yield CounterMetricFamily("rag_llm_prompt_tokens", "Prompt tokens prefilled", value=llm["prompt_tokens"])
+            yield CounterMetricFamily("rag_llm_eval_tokens", "Tokens generated", value=llm["eval_tokens"])
+
+def watch(**sources: Callable[[], dict]):
+    """Exposes stats() dicts at scrape time: caches=, admission=, llm=, batchers= (see _StatsCollector)."""
+    if METRICS_ENABLED:
+        REGISTRY.register(_StatsCollector(sources))
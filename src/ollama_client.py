@@ -1,40 +1,631 @@
+import asyncio
+import json
+import math
+import random
+import socket
+import threading
+from typing import AsyncIterator, Iterator
 import httpx
 try:
-    from .config import OLLAMA_URL, OLLAMA_MODEL, MAX_TOKENS, TEMPERATURE
+    from .config import (
+        OLLAMA_URL, OLLAMA_MODEL, MAX_TOKENS, TEMPERATURE, OLLAMA_ENDPOINT, OLLAMA_KEEP_ALIVE,
+        OLLAMA_TIMEOUT, OLLAMA_CONNECT_TIMEOUT, OLLAMA_MAX_CONNECTIONS, OLLAMA_NUM_CTX_STEP,
+        OLLAMA_NUM_CTX_MIN, OLLAMA_NUM_CTX_MAX, PROMPT_CONTEXT_FIRST, OLLAMA_URLS,
+        OLLAMA_HEALTH_INTERVAL, OLLAMA_EJECT_AFTER, OLLAMA_PREFER_LOADED, DEADLINE_MIN_TOKENS,
+        CONTEXT_TOKEN_BUDGET
+    )
+    from .context_builder import load_token_counter
+    from .deadline import Deadline, DeadlineExceeded
 except ImportError:
-    from config import OLLAMA_URL, OLLAMA_MODEL, MAX_TOKENS, TEMPERATURE
+    from config import (
+        OLLAMA_URL, OLLAMA_MODEL, MAX_TOKENS, TEMPERATURE, OLLAMA_ENDPOINT, OLLAMA_KEEP_ALIVE,
+        OLLAMA_TIMEOUT, OLLAMA_CONNECT_TIMEOUT, OLLAMA_MAX_CONNECTIONS, OLLAMA_NUM_CTX_STEP,
+        OLLAMA_NUM_CTX_MIN, OLLAMA_NUM_CTX_MAX, PROMPT_CONTEXT_FIRST, OLLAMA_URLS,
+        OLLAMA_HEALTH_INTERVAL, OLLAMA_EJECT_AFTER, OLLAMA_PREFER_LOADED, DEADLINE_MIN_TOKENS,
+        CONTEXT_TOKEN_BUDGET
+    )
+    from context_builder import load_token_counter
+    from deadline import Deadline, DeadlineExceeded
 
+# Sent byte-for-byte identically on every request so Ollama can reuse its KV cache for it
 SYSTEM = "You are an HTU assistant. Answer using ONLY the provided context. Cite sources with [1], [2]. If insufficient, say you don't know."
 
-def chat(question: str, context: str) -> str:
-    messages = [
-        {"role": "system", "content": SYSTEM},
-        {"role": "user", "content": f"Q: {question}\n\nContext:\n{context}\n\nA:"}
-    ]
-    payload = {
-        "model": OLLAMA_MODEL,
-        "messages": messages,
-        "stream": False,
-        "options": {"temperature": TEMPERATURE, "num_predict": MAX_TOKENS}
-    }
-    try:
-        r = httpx.post(f"{OLLAMA_URL}/api/chat", json=payload, timeout=120.0)
-        r.raise_for_status()
+class OllamaError(RuntimeError):
+    pass
+
+class OllamaUnavailable(OllamaError):
+    """The server could not be reached; nothing was generated, so another backend may be tried."""
+
+# Template tokens the prompt gets on top of SYSTEM and the user message
+PROMPT_OVERHEAD_TOKENS = 32
+
+def _delta(line: str) -> tuple[str, dict]:
+    """(text, parsed line) for one NDJSON line of a streaming /api/chat or /api/generate response."""
+    d = json.loads(line)
+    if "error" in d:
+        raise OllamaError(f"Ollama error: {d['error']}")
+    text = d["message"].get("content", "") if "message" in d else d.get("response", "")
+    return text, d
+
+def _left(deadline: Deadline | None) -> float | None:
+    if deadline is None or math.isinf(deadline.remaining()):
+        return None
+    return deadline.remaining()
+
+class _Cutoff:
+    """Shuts a streaming response's socket down when the deadline passes.
+
+    httpx's read timeout applies to each read, so a stream that keeps trickling
+    bytes is never cut off by it; this bounds the whole response instead.
+    """
+
+    def __init__(self, r: httpx.Response, deadline: Deadline | None):
+        self.fired = False
+        self._timer = None
+        left = _left(deadline)
+        stream = r.extensions.get("network_stream")
+        sock = stream.get_extra_info("socket") if stream is not None else None
+        if left is not None and sock is not None:
+            self._timer = threading.Timer(left, self._fire, args=(sock,))
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _fire(self, sock: socket.socket):
+        self.fired = True
+        try:
+            sock.shutdown(socket.SHUT_RDWR)  # wakes up the blocked read
+        except OSError:
+            pass
+
+    def cancel(self):
+        if self._timer is not None:
+            self._timer.cancel()
+
+async def _alines(r: httpx.Response, deadline: Deadline | None) -> AsyncIterator[str]:
+    """`r.aiter_lines()`, raising TimeoutError once the deadline passes (see _Cutoff)."""
+    lines = r.aiter_lines()
+    while True:
+        try:
+            async with asyncio.timeout(_left(deadline)):
+                line = await anext(lines)
+        except StopAsyncIteration:
+            return
+        yield line
+
+def _user_prompt(question: str, context: str) -> str:
+    # Context first: the varying question comes last, so requests over the same
+    # context share a longer cached prefix
+    if PROMPT_CONTEXT_FIRST:
+        return f"Context:\n{context}\n\nQ: {question}\n\nA:"
+    return f"Q: {question}\n\nContext:\n{context}\n\nA:"
+
+def _timings(d: dict) -> dict:
+    """Ollama's final-response counters (durations in ns) as ms."""
+    ms = lambda k: round(d.get(k, 0) / 1e6, 2)
+    return {"prompt_tokens": d.get("prompt_eval_count", 0), "prefill_ms": ms("prompt_eval_duration"),
+            "eval_tokens": d.get("eval_count", 0), "eval_ms": ms("eval_duration"), "load_ms": ms("load_duration")}
+
+def _chat_text(data) -> str | None:
+    if "message" in data and "content" in data["message"]:
+        return data["message"]["content"]
+    if isinstance(data, dict) and "messages" in data:
+        return "\n".join(m.get("content","") for m in data["messages"] if m.get("role") == "assistant")
+    return None
+
+class OllamaClient:
+    """Long-lived connection pool to one Ollama server.
+
+    Which generation endpoint the server has (/api/chat, or /api/generate on
+    old versions) is worked out on the first call and remembered; after that a
+    failed generation raises OllamaError instead of being re-run on the other
+    endpoint. Every request carries `keep_alive` so the model stays loaded,
+    and one fixed `num_ctx` that fits the largest prompt; Ollama's prefill (prompt_eval)
+    counters are accumulated in `stats()`. With a `Deadline`, num_predict and
+    the HTTP timeout shrink to the time left, and a generation still running
+    at the deadline (however slowly it streams) is cut off with DeadlineExceeded
+    carrying the partial text.
+    """
+
+    def __init__(self, url: str = OLLAMA_URL, model: str = OLLAMA_MODEL, endpoint: str = OLLAMA_ENDPOINT,
+                 keep_alive: str = OLLAMA_KEEP_ALIVE, timeout: float = OLLAMA_TIMEOUT):
+        self.url = url.rstrip("/")
+        self.model = model
+        self.keep_alive = keep_alive
+        self.endpoint = None if endpoint == "auto" else endpoint
+        self._timeout = httpx.Timeout(timeout, connect=OLLAMA_CONNECT_TIMEOUT)
+        self._limits = httpx.Limits(max_connections=OLLAMA_MAX_CONNECTIONS,
+                                    max_keepalive_connections=OLLAMA_MAX_CONNECTIONS)
+        self.client = httpx.Client(base_url=self.url, timeout=self._timeout, limits=self._limits)
+        self._aclient: httpx.AsyncClient | None = None
+        self._probe_lock = threading.Lock()
+        self.count_tokens = load_token_counter()
+        self._stats_lock = threading.Lock()
+        self._totals = {"requests": 0, "prompt_tokens": 0, "prefill_ms": 0.0, "eval_tokens": 0, "eval_ms": 0.0}
+
+    @property
+    def aclient(self) -> httpx.AsyncClient:
+        if self._aclient is None:
+            self._aclient = httpx.AsyncClient(base_url=self.url, timeout=self._timeout, limits=self._limits)
+        return self._aclient
+
+    def num_ctx(self) -> int | None:
+        """The same for every request: Ollama reloads the model whenever num_ctx changes."""
+        if OLLAMA_NUM_CTX_STEP <= 0:
+            return None
+        need = self.count_tokens(SYSTEM) + CONTEXT_TOKEN_BUDGET + MAX_TOKENS + PROMPT_OVERHEAD_TOKENS
+        size = -(-need // OLLAMA_NUM_CTX_STEP) * OLLAMA_NUM_CTX_STEP
+        return max(OLLAMA_NUM_CTX_MIN, min(size, OLLAMA_NUM_CTX_MAX))
+
+    def _payload(self, endpoint: str, question: str, context: str, stream: bool = False,
+                 deadline: Deadline | None = None) -> dict:
+        user = _user_prompt(question, context)
+        prompt_tokens = self.count_tokens(SYSTEM) + self.count_tokens(user) + PROMPT_OVERHEAD_TOKENS
+        num_predict = MAX_TOKENS
+        if deadline is not None:
+            num_predict = deadline.max_tokens(prompt_tokens, MAX_TOKENS)
+            if num_predict < DEADLINE_MIN_TOKENS:
+                raise DeadlineExceeded()
+        options = {"temperature": TEMPERATURE, "num_predict": num_predict}
+        num_ctx = self.num_ctx()
+        if num_ctx:
+            options["num_ctx"] = num_ctx
+        body = {
+            "model": self.model,
+            "stream": stream,
+            "keep_alive": self.keep_alive,
+            "options": options
+        }
+        if endpoint == "chat":
+            body["messages"] = [
+                {"role": "system", "content": SYSTEM},
+                {"role": "user", "content": user}
+            ]
+        else:
+            body["prompt"] = f"{SYSTEM}\n\n{user}"
+        return body
+
+    def _record(self, d: dict, stats: dict | None):
+        t = _timings(d)
+        with self._stats_lock:
+            self._totals["requests"] += 1
+            for k in ("prompt_tokens", "prefill_ms", "eval_tokens", "eval_ms"):
+                self._totals[k] += t[k]
+        if stats is not None:
+            stats.update(t)
+
+    def totals(self) -> dict:
+        with self._stats_lock:
+            return dict(self._totals)
+
+    def stats(self) -> dict:
+        return _summarize(self.totals())
+
+    def _resolve(self, r: httpx.Response) -> str | None:
+        """Memoizes the endpoint from the first /api/chat response; None means retry on /api/generate."""
+        if r.status_code == 404 and "model" not in r.text.lower():
+            self.endpoint = "generate"
+            print(f"[ollama] {self.url} has no /api/chat; using /api/generate")
+            return None
+        self.endpoint = "chat"
+        return "chat"
+
+    @staticmethod
+    def _check(r: httpx.Response):
+        if r.is_error:
+            r.read()
+            raise OllamaError(f"Ollama {r.request.url.path} returned {r.status_code}: {r.text[:200]}")
+
+    @staticmethod
+    def _text(endpoint: str, data: dict) -> str:
+        text = _chat_text(data) if endpoint == "chat" else data.get("response")
+        if text is None:
+            raise OllamaError(f"Unexpected Ollama response: {str(data)[:200]}")
+        return text
+
+    def _post(self, question: str, context: str, stream: bool = False,
+              deadline: Deadline | None = None) -> tuple[str, httpx.Response]:
+        # Streaming responses are returned unread; the caller closes them
+        if self.endpoint is None:
+            with self._probe_lock:
+                if self.endpoint is None:
+                    r = self._send("chat", question, context, stream, deadline)
+                    if self._resolve(r):
+                        return "chat", r
+                    r.close()
+        return self.endpoint, self._send(self.endpoint, question, context, stream, deadline)
+
+    def _request(self, client, endpoint: str, question: str, context: str, stream: bool,
+                 deadline: Deadline | None) -> httpx.Request:
+        timeout = self._timeout
+        if deadline is not None:
+            left = deadline.timeout(self._timeout.read)
+            timeout = httpx.Timeout(left, connect=min(OLLAMA_CONNECT_TIMEOUT, left))
+        return client.build_request("POST", f"/api/{endpoint}", timeout=timeout,
+                                    json=self._payload(endpoint, question, context, stream, deadline))
+
+    def _failed(self, e: httpx.HTTPError, deadline: Deadline | None, partial: str = "") -> Exception:
+        if isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout)) and not partial:
+            return OllamaUnavailable(f"Ollama at {self.url} unreachable: {e!r}")
+        if isinstance(e, httpx.TimeoutException) and deadline is not None and deadline.expired():
+            return DeadlineExceeded(partial)
+        return OllamaError(f"Ollama request failed: {e!r}")
+
+    def _send(self, endpoint: str, question: str, context: str, stream: bool,
+              deadline: Deadline | None = None) -> httpx.Response:
+        req = self._request(self.client, endpoint, question, context, stream, deadline)
+        try:
+            return self.client.send(req, stream=stream)
+        except httpx.HTTPError as e:
+            raise self._failed(e, deadline) from e
+
+    def chat(self, question: str, context: str, stats: dict | None = None,
+             deadline: Deadline | None = None) -> str:
+        """`stats`, if given, receives Ollama's prefill/generation timings for this call."""
+        if deadline is not None and deadline.budget:
+            # Streamed under the hood, so whatever was generated by the deadline can be returned
+            return "".join(self.chat_stream(question, context, stats, deadline))
+        endpoint, r = self._post(question, context)
+        self._check(r)
         data = r.json()
-        if "message" in data and "content" in data["message"]:
-            return data["message"]["content"]
-        if isinstance(data, dict) and "messages" in data:
-            return "\n".join(m.get("content","") for m in data["messages"] if m.get("role") == "assistant")
-    except Exception:
-        pass
-
-    gen_payload = {
-        "model": OLLAMA_MODEL,
-        "prompt": f"{SYSTEM}\n\nQ: {question}\n\nContext:\n{context}\n\nA:",
-        "stream": False,
-        "options": {"temperature": TEMPERATURE, "num_predict": MAX_TOKENS}
+        self._record(data, stats)
+        return self._text(endpoint, data)
+
+    def chat_stream(self, question: str, context: str, stats: dict | None = None,
+                    deadline: Deadline | None = None) -> Iterator[str]:
+        """Yields answer text deltas as Ollama produces them."""
+        _, r = self._post(question, context, stream=True, deadline=deadline)
+        parts = []
+        cutoff = _Cutoff(r, deadline)
+        try:
+            self._check(r)
+            for line in r.iter_lines():
+                if not line:
+                    continue
+                text, d = _delta(line)
+                if text:
+                    parts.append(text)
+                    yield text
+                if d.get("done"):
+                    self._record(d, stats)
+                    if deadline is not None and d.get("done_reason") == "length" and deadline.degraded:
+                        deadline.note("truncated")
+                    break
+                if deadline is not None and deadline.expired():
+                    raise DeadlineExceeded("".join(parts))
+        except httpx.HTTPError as e:
+            if cutoff.fired:
+                raise DeadlineExceeded("".join(parts)) from e
+            raise self._failed(e, deadline, "".join(parts)) from e
+        finally:
+            cutoff.cancel()
+            r.close()
+
+    async def _apost(self, question: str, context: str, stream: bool = False,
+                     deadline: Deadline | None = None) -> tuple[str, httpx.Response]:
+        if self.endpoint is None:
+            r = await self._asend("chat", question, context, stream, deadline)
+            if self._resolve(r):
+                return "chat", r
+            await r.aclose()
+        return self.endpoint, await self._asend(self.endpoint, question, context, stream, deadline)
+
+    async def _asend(self, endpoint: str, question: str, context: str, stream: bool,
+                     deadline: Deadline | None = None) -> httpx.Response:
+        req = self._request(self.aclient, endpoint, question, context, stream, deadline)
+        try:
+            return await self.aclient.send(req, stream=stream)
+        except httpx.HTTPError as e:
+            raise self._failed(e, deadline) from e
+
+    async def chat_async(self, question: str, context: str, stats: dict | None = None,
+                         deadline: Deadline | None = None) -> str:
+        if deadline is not None and deadline.budget:
+            return "".join([t async for t in self.chat_stream_async(question, context, stats, deadline)])
+        endpoint, r = await self._apost(question, context)
+        self._check(r)
+        data = r.json()
+        self._record(data, stats)
+        return self._text(endpoint, data)
+
+    async def chat_stream_async(self, question: str, context: str, stats: dict | None = None,
+                                deadline: Deadline | None = None) -> AsyncIterator[str]:
+        _, r = await self._apost(question, context, stream=True, deadline=deadline)
+        parts = []
+        try:
+            if r.is_error:
+                await r.aread()
+                raise OllamaError(f"Ollama {r.request.url.path} returned {r.status_code}: {r.text[:200]}")
+            async for line in _alines(r, deadline):
+                if not line:
+                    continue
+                text, d = _delta(line)
+                if text:
+                    parts.append(text)
+                    yield text
+                if d.get("done"):
+                    self._record(d, stats)
+                    if deadline is not None and d.get("done_reason") == "length" and deadline.degraded:
+                        deadline.note("truncated")
+                    break
+                if deadline is not None and deadline.expired():
+                    raise DeadlineExceeded("".join(parts))
+        except TimeoutError as e:
+            raise DeadlineExceeded("".join(parts)) from e
+        except httpx.HTTPError as e:
+            raise self._failed(e, deadline, "".join(parts)) from e
+        finally:
+            await r.aclose()
+
+    def preload(self, timeout: float = OLLAMA_TIMEOUT):
+        """Ask Ollama to load the model into memory (an empty prompt only loads the model)."""
+        body = {"model": self.model, "prompt": "", "keep_alive": self.keep_alive}
+        if self.num_ctx():
+            body["options"] = {"num_ctx": self.num_ctx()}  # loaded with the context size requests will use
+        r = self.client.post("/api/generate", json=body, timeout=timeout)
+        r.raise_for_status()
+
+    def health(self, timeout: float = 2.0) -> tuple[bool, bool]:
+        """(model available, model loaded in memory); raises if the server is unreachable."""
+        r = self.client.get("/api/tags", timeout=timeout)
+        r.raise_for_status()
+        names = {m.get("name") for m in r.json().get("models", [])}
+        want = {self.model, f"{self.model}:latest"}
+        available = bool(names & want)
+        try:
+            ps = self.client.get("/api/ps", timeout=timeout)
+            loaded = ps.is_success and bool({m.get("name") for m in ps.json().get("models", [])} & want)
+        except httpx.HTTPError:
+            loaded = False  # /api/ps is missing on old servers
+        return available, loaded
+
+    def close(self):
+        self.client.close()
+
+def _summarize(t: dict) -> dict:
+    n = max(t["requests"], 1)
+    return {
+        **t,
+        "mean_prompt_tokens": t["prompt_tokens"] / n,
+        "mean_prefill_ms": t["prefill_ms"] / n,
+        "prefill_ms_per_token": t["prefill_ms"] / max(t["prompt_tokens"], 1),
+        "eval_tokens_per_s": t["eval_tokens"] / (t["eval_ms"] / 1000) if t["eval_ms"] else 0.0,
+        "prompt_context_first": PROMPT_CONTEXT_FIRST,
     }
-    r2 = httpx.post(f"{OLLAMA_URL}/api/generate", json=gen_payload, timeout=120.0)
-    r2.raise_for_status()
-    d2 = r2.json()
-    return d2.get("response", "")
+
+class _Backend:
+    __slots__ = ("client", "outstanding", "healthy", "loaded", "failures", "last_error", "ejections")
+
+    def __init__(self, client: OllamaClient):
+        self.client = client
+        self.outstanding = 0
+        self.healthy = True
+        self.loaded = False
+        self.failures = 0
+        self.last_error = None
+        self.ejections = 0
+
+class OllamaPool:
+    """Routes generations over several Ollama servers.
+
+    Each call goes to the healthy backend with the fewest requests in flight;
+    among equally busy ones, backends that already have the model in memory
+    win (OLLAMA_PREFER_LOADED). A backend is ejected after OLLAMA_EJECT_AFTER consecutive failures
+    or a failed health check (/api/tags reachable and listing the model), and
+    re-admitted when a later check passes. A backend that cannot be reached at
+    all has generated nothing, so the call moves on to the next one. With a
+    single URL this is a thin wrapper around one OllamaClient.
+    """
+
+    def __init__(self, urls: list[str] = OLLAMA_URLS, health_interval: float = OLLAMA_HEALTH_INTERVAL,
+                 eject_after: int = OLLAMA_EJECT_AFTER, prefer_loaded: bool = OLLAMA_PREFER_LOADED, **kwargs):
+        if not urls:
+            raise ValueError("No Ollama URLs configured")
+        self.backends = [_Backend(OllamaClient(u, **kwargs)) for u in urls]
+        self.eject_after = eject_after
+        self.prefer_loaded = prefer_loaded
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._checker = None
+        if len(self.backends) > 1 and health_interval > 0:
+            self._checker = threading.Thread(target=self._check_loop, args=(health_interval,),
+                                             name="ollama-health", daemon=True)
+            self._checker.start()
+
+    # -- routing --
+
+    def _pick(self, exclude: set) -> _Backend:
+        with self._lock:
+            cands = [b for b in self.backends if b.healthy and b not in exclude]
+            if not cands:
+                # Everything is ejected: better to try than to refuse outright
+                cands = [b for b in self.backends if b not in exclude]
+            if not cands:
+                raise OllamaUnavailable("No reachable Ollama backend")
+            low = min(b.outstanding for b in cands)
+            cands = [b for b in cands if b.outstanding == low]
+            # Loaded only breaks ties: an unloaded host still gets traffic (and so reloads the model)
+            if self.prefer_loaded and any(b.loaded for b in cands):
+                cands = [b for b in cands if b.loaded]
+            b = random.choice(cands)
+            b.outstanding += 1
+            return b
+
+    def _done(self, b: _Backend, error: Exception | None = None):
+        with self._lock:
+            b.outstanding -= 1
+            if error is None:
+                b.failures = 0
+                return
+            b.failures += 1
+            b.last_error = repr(error)
+            if b.healthy and b.failures >= self.eject_after:
+                self._eject(b)
+
+    def _eject(self, b: _Backend):
+        b.healthy = False
+        b.ejections += 1
+        print(f"[ollama] ejecting {b.client.url}: {b.last_error}")
+
+    def chat(self, question: str, context: str, stats: dict | None = None,
+             deadline: Deadline | None = None) -> str:
+        tried = set()
+        while True:
+            b, error = self._pick(tried), None
+            try:
+                return b.client.chat(question, context, stats, deadline)
+            except OllamaUnavailable as e:
+                error = e
+                tried.add(b)
+                if len(tried) == len(self.backends):
+                    raise
+            except OllamaError as e:
+                error = e
+                raise
+            finally:
+                self._done(b, error)
+
+    async def chat_async(self, question: str, context: str, stats: dict | None = None,
+                         deadline: Deadline | None = None) -> str:
+        tried = set()
+        while True:
+            b, error = self._pick(tried), None
+            try:
+                return await b.client.chat_async(question, context, stats, deadline)
+            except OllamaUnavailable as e:
+                error = e
+                tried.add(b)
+                if len(tried) == len(self.backends):
+                    raise
+            except OllamaError as e:
+                error = e
+                raise
+            finally:
+                self._done(b, error)
+
+    def chat_stream(self, question: str, context: str, stats: dict | None = None,
+                    deadline: Deadline | None = None) -> Iterator[str]:
+        tried = set()
+        while True:
+            b, started, error = self._pick(tried), False, None
+            try:
+                for text in b.client.chat_stream(question, context, stats, deadline):
+                    started = True
+                    yield text
+                return
+            except OllamaUnavailable as e:
+                error = e
+                tried.add(b)
+                if started or len(tried) == len(self.backends):
+                    raise
+            except OllamaError as e:
+                error = e
+                raise
+            finally:
+                self._done(b, error)
+
+    async def chat_stream_async(self, question: str, context: str, stats: dict | None = None,
+                                deadline: Deadline | None = None) -> AsyncIterator[str]:
+        tried = set()
+        while True:
+            b, started, error = self._pick(tried), False, None
+            try:
+                async for text in b.client.chat_stream_async(question, context, stats, deadline):
+                    started = True
+                    yield text
+                return
+            except OllamaUnavailable as e:
+                error = e
+                tried.add(b)
+                if started or len(tried) == len(self.backends):
+                    raise
+            except OllamaError as e:
+                error = e
+                raise
+            finally:
+                self._done(b, error)
+
+    # -- health --
+
+    def check(self):
+        """Health-checks every backend once, ejecting and re-admitting as needed."""
+        for b in self.backends:
+            try:
+                available, loaded = b.client.health()
+                error = None if available else f"model {b.client.model} not on server"
+            except Exception as e:
+                available, loaded, error = False, False, repr(e)
+            with self._lock:
+                b.loaded = loaded
+                if available:
+                    if not b.healthy:
+                        print(f"[ollama] re-admitting {b.client.url}")
+                    b.healthy, b.failures = True, 0
+                elif b.healthy:
+                    b.last_error = error
+                    self._eject(b)
+
+    def _check_loop(self, interval: float):
+        while not self._stop.wait(interval):
+            self.check()
+
+    def preload(self, timeout: float = OLLAMA_TIMEOUT):
+        """Loads the model on every backend; fails only if none of them could."""
+        errors = []
+        for b in self.backends:
+            try:
+                b.client.preload(timeout)
+                b.loaded = True
+            except Exception as e:
+                errors.append(f"{b.client.url}: {e!r}")
+        if len(errors) == len(self.backends):
+            raise OllamaError("; ".join(errors))
+        for e in errors:
+            print(f"[ollama] preload failed on {e}")
+
+    def stats(self) -> dict:
+        t = {"requests": 0, "prompt_tokens": 0, "prefill_ms": 0.0, "eval_tokens": 0, "eval_ms": 0.0}
+        for b in self.backends:
+            for k, v in b.client.totals().items():
+                t[k] += v
+        with self._lock:
+            backends = [{"url": b.client.url, "healthy": b.healthy, "model_loaded": b.loaded,
+                         "outstanding": b.outstanding, "failures": b.failures, "ejections": b.ejections,
+                         "endpoint": b.client.endpoint, "last_error": b.last_error} for b in self.backends]
+        return {**_summarize(t), "backends": backends}
+
+    def close(self):
+        self._stop.set()
+        for b in self.backends:
+            b.client.close()
+
+_default: OllamaPool | None = None
+_default_lock = threading.Lock()
+
+def default_client() -> OllamaPool:
+    global _default
+    if _default is None:
+        with _default_lock:
+            if _default is None:
+                _default = OllamaPool()
+    return _default
+
+def chat(question: str, context: str, stats: dict | None = None, deadline: Deadline | None = None) -> str:
+    return default_client().chat(question, context, stats, deadline)
+
+def chat_stream(question: str, context: str, stats: dict | None = None,
+                deadline: Deadline | None = None) -> Iterator[str]:
+    return default_client().chat_stream(question, context, stats, deadline)
+
+def preload(timeout: float = OLLAMA_TIMEOUT):
+    default_client().preload(timeout)
+
+async def chat_async(question: str, context: str, stats: dict | None = None,
+                     deadline: Deadline | None = None) -> str:
+    return await default_client().chat_async(question, context, stats, deadline)
+
+def chat_stream_async(question: str, context: str, stats: dict | None = None,
+                      deadline: Deadline | None = None) -> AsyncIterator[str]:
+    return default_client().chat_stream_async(question, context, stats, deadline)
+
+def llm_stats() -> dict:
+    return default_client().stats()
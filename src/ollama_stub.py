@@ -0,0 +1,193 @@
+"""A stand-in for an Ollama server, for load-balancing checks and offline benchmarks.
+
+Serves /api/tags, /api/ps, /api/version, /api/chat and /api/generate
+(streaming and not) with a canned answer, emitting one token every
+`token_ms` after `first_token_ms`, and reporting prompt_eval/eval counters
+like Ollama does. Behaviour can be changed while running:
+
+  stub.fail = True        every generation returns 500
+  stub.loaded = False     /api/ps lists no model
+  stub.models = []        /api/tags lists no model (fails health checks)
+  stub.chat = False       no /api/chat (an old server)
+
+  python -m src.ollama_stub --port 11435 --token-ms 20 --tokens 60
+"""
+import json, time, socket, threading, argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    from .config import OLLAMA_MODEL
+except ImportError:
+    from config import OLLAMA_MODEL
+
+ANSWER = "According to the provided context, the answer is on the university website [1]."
+
+class StubOllama:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, model: str = OLLAMA_MODEL,
+                 token_ms: float = 0.0, first_token_ms: float = 0.0, tokens: int = 0,
+                 prefill_ms_per_token: float = 0.0):
+        self.models = [model]
+        self.loaded = True
+        self.fail = False
+        self.chat = True
+        self.token_ms = token_ms
+        self.first_token_ms = first_token_ms
+        self.tokens = tokens  # 0 = the words of ANSWER
+        self.prefill_ms_per_token = prefill_ms_per_token
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self._conns = set()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StubOllama":
+        self._thread = threading.Thread(target=self.server.serve_forever, name="ollama-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stops like a killed server: the port is closed and so are open keep-alive connections."""
+        self.server.shutdown()
+        self.server.server_close()
+        with self._lock:
+            conns, self._conns = list(self._conns), set()
+        for c in conns:
+            try:
+                c.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def _words(self) -> list:
+        words = ANSWER.split(" ")
+        if self.tokens:
+            words = (words * (self.tokens // len(words) + 1))[:self.tokens]
+        return [w if i == 0 else " " + w for i, w in enumerate(words)]
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def setup(self):
+                super().setup()
+                with stub._lock:
+                    stub._conns.add(self.connection)
+
+            def finish(self):
+                with stub._lock:
+                    stub._conns.discard(self.connection)
+                super().finish()
+
+            def handle(self):
+                try:
+                    super().handle()
+                except (ConnectionResetError, BrokenPipeError):
+                    pass  # client went away (closed a pooled connection, or gave up mid-stream)
+
+            def _json(self, code: int, obj):
+                body = json.dumps(obj).encode()
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path == "/api/tags":
+                    return self._json(200, {"models": [{"name": m} for m in stub.models]})
+                if self.path == "/api/ps":
+                    return self._json(200, {"models": [{"name": m} for m in stub.models] if stub.loaded else []})
+                if self.path == "/api/version":
+                    return self._json(200, {"version": "0.0.0-stub"})
+                self._json(404, {"error": "not found"})
+
+            def do_POST(self):
+                n = int(self.headers.get("Content-Length") or 0)
+                req = json.loads(self.rfile.read(n) or b"{}")
+                if self.path == "/api/chat" and stub.chat:
+                    prompt = "".join(m.get("content", "") for m in req.get("messages", []))
+                    return self._generate(req, prompt, lambda t: {"message": {"role": "assistant", "content": t}})
+                if self.path == "/api/generate":
+                    if not req.get("prompt"):  # preload
+                        stub.loaded = True
+                        return self._json(200, {"model": req.get("model"), "response": "", "done": True})
+                    return self._generate(req, req["prompt"], lambda t: {"response": t})
+                self.send_response(404)
+                self.send_header("Content-Length", "18")
+                self.end_headers()
+                self.wfile.write(b"404 page not found")
+
+            def _generate(self, req: dict, prompt: str, wrap):
+                if req.get("model") not in stub.models:
+                    return self._json(404, {"error": f"model '{req.get('model')}' not found"})
+                if stub.fail:
+                    return self._json(500, {"error": "stub failure"})
+                with stub._lock:
+                    stub.requests += 1
+                    stub.in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+                try:
+                    self._respond(req, prompt, wrap)
+                finally:
+                    with stub._lock:
+                        stub.in_flight -= 1
+
+            def _respond(self, req: dict, prompt: str, wrap):
+                words = stub._words()
+                limit = (req.get("options") or {}).get("num_predict")
+                reason = "stop"
+                if limit and 0 < limit < len(words):
+                    words, reason = words[:limit], "length"
+                prompt_tokens = max(1, len(prompt) // 4)
+                prefill = stub.first_token_ms + prompt_tokens * stub.prefill_ms_per_token
+                final = {"done": True, "done_reason": reason, "prompt_eval_count": prompt_tokens,
+                         "prompt_eval_duration": int(prefill * 1e6), "eval_count": len(words),
+                         "eval_duration": int(len(words) * stub.token_ms * 1e6)}
+                time.sleep(prefill / 1000)
+                if not req.get("stream"):
+                    time.sleep(len(words) * stub.token_ms / 1000)
+                    return self._json(200, {**wrap("".join(words)), **final})
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for w in words:
+                    self._chunk({**wrap(w), "done": False})
+                    time.sleep(stub.token_ms / 1000)
+                self._chunk({**wrap(""), **final})
+                self.wfile.write(b"0\r\n\r\n")
+
+            def _chunk(self, obj: dict):
+                data = (json.dumps(obj) + "\n").encode()
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+        return Handler
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Run a stub Ollama server.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=11435)
+    ap.add_argument("--model", default=OLLAMA_MODEL)
+    ap.add_argument("--token-ms", type=float, default=20.0)
+    ap.add_argument("--first-token-ms", type=float, default=100.0)
+    ap.add_argument("--tokens", type=int, default=0)
+    args = ap.parse_args()
+    stub = StubOllama(args.host, args.port, args.model, args.token_ms, args.first_token_ms, args.tokens).start()
+    print(f"[stub] Ollama stub on {stub.url} (model {args.model})")
+    try:
+        stub._thread.join()
+    except KeyboardInterrupt:
+        stub.stop()
@@ -0,0 +1,141 @@
+"""On-demand sampling profiles of single requests.
+
+With PROFILE_ENABLED=true, a request is profiled when it asks for it (the
+`X-Profile: 1` header on /ask) or is picked at random with probability
+PROFILE_SAMPLE_RATE. While it runs, a background thread snapshots every
+thread's Python stack (`sys._current_frames()`) each PROFILE_INTERVAL_MS and
+counts identical stacks. When the request ends the counts are written to
+PROFILE_DIR/<profile_id>.collapsed in the collapsed-stack format that
+flamegraph.pl, speedscope and inferno read:
+
+  MainThread;answer (rag_service_local.py:351);search (rag_service_local.py:170);... 12
+
+The response carries "profile_id". Each stack starts with the thread name,
+because part of the work runs on the model-*, *-batcher and Ollama threads.
+Other requests running at the same time show up in the profile too.
+
+With PROFILE_ENABLED=false (the default) `profiled` only adds one flag check
+per call.
+
+  flamegraph.pl data/profiles/<profile_id>.collapsed > profile.svg
+"""
+import functools, inspect, os, random, sys, threading, time, uuid
+from collections import Counter
+from typing import Optional
+
+try:
+    from .config import PROFILE_ENABLED, PROFILE_SAMPLE_RATE, PROFILE_INTERVAL_MS, PROFILE_DIR, PROFILE_MAX_CONCURRENT
+except ImportError:
+    from config import PROFILE_ENABLED, PROFILE_SAMPLE_RATE, PROFILE_INTERVAL_MS, PROFILE_DIR, PROFILE_MAX_CONCURRENT
+
+MAX_DEPTH = 128
+
+_running = threading.BoundedSemaphore(max(PROFILE_MAX_CONCURRENT, 1))
+
+def _frame(f) -> str:
+    code = f.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{f.f_lineno})"
+
+class Sampler:
+    """Samples all threads' stacks until `stop()`, then writes them as collapsed stacks."""
+
+    def __init__(self, interval_ms: float = PROFILE_INTERVAL_MS, out_dir: str = PROFILE_DIR):
+        self.interval = interval_ms / 1000
+        self.out_dir = out_dir
+        self.id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def start(self) -> "Sampler":
+        self.t0 = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def _run(self):
+        me = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for tid, f in sys._current_frames().items():
+                if tid == me:
+                    continue
+                if tid not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                stack = []
+                while f is not None and len(stack) < MAX_DEPTH:
+                    stack.append(_frame(f))
+                    f = f.f_back
+                stack.append(names.get(tid, str(tid)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self) -> str:
+        """Stops sampling and writes the profile; returns its path."""
+        self._stop.set()
+        self._thread.join()
+        os.makedirs(self.out_dir, exist_ok=True)
+        path = os.path.join(self.out_dir, f"{self.id}.collapsed")
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, n in self.stacks.most_common():
+                f.write(f"{stack} {n}\n")
+        print(f"[profile] {self.id}: {self.samples} samples over "
+              f"{time.perf_counter() - self.t0:.2f}s -> {path}")
+        return path
+
+def wanted(requested: Optional[bool] = None) -> bool:
+    """Whether to profile this call: explicitly requested, or sampled at PROFILE_SAMPLE_RATE."""
+    if not PROFILE_ENABLED or requested is False:
+        return False
+    return bool(requested) or random.random() < PROFILE_SAMPLE_RATE
+
+def _start(requested: Optional[bool]) -> Optional[Sampler]:
+    # At most PROFILE_MAX_CONCURRENT samplers; a request that finds them busy just isn't profiled
+    if not wanted(requested) or not _running.acquire(blocking=False):
+        return None
+    try:
+        return Sampler().start()
+    except Exception:
+        _running.release()
+        raise
+
+def _stop(sampler: Sampler, res):
+    try:
+        sampler.stop()
+    except OSError as e:
+        print(f"[profile] writing {sampler.id} failed: {e!r}")
+        return
+    finally:
+        _running.release()
+    if isinstance(res, dict):
+        res["profile_id"] = sampler.id
+
+def profiled(fn):
+    """Adds a `profile` keyword (None = sample at PROFILE_SAMPLE_RATE) to a function returning a dict;
+    a profiled call's result gets "profile_id"."""
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, profile: Optional[bool] = None, **kwargs):
+            if not PROFILE_ENABLED:
+                return await fn(*args, **kwargs)
+            sampler, res = _start(profile), None
+            try:
+                res = await fn(*args, **kwargs)
+                return res
+            finally:
+                if sampler is not None:
+                    _stop(sampler, res)
+        return wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, profile: Optional[bool] = None, **kwargs):
+        if not PROFILE_ENABLED:
+            return fn(*args, **kwargs)
+        sampler, res = _start(profile), None
+        try:
+            res = fn(*args, **kwargs)
+            return res
+        finally:
+            if sampler is not None:
+                _stop(sampler, res)
+    return wrapper
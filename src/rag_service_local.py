@@ -1,79 +1,605 @@
-from typing import List, Tuple
-from qdrant_client import QdrantClient
-from qdrant_client.models import Filter, FieldCondition, MatchValue
-from sentence_transformers import SentenceTransformer
-from transformers import AutoTokenizer, AutoModelForSequenceClassification
-import torch
+import asyncio, threading, time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import AsyncIterator, Iterator, List, Tuple
 
 try:
     from .config import (
-        EMBEDDING_MODEL, QDRANT_URL, QDRANT_COLLECTION, TOP_K,
-        ENABLE_RERANKER, RERANKER_MODEL
+        TOP_K, ENABLE_RERANKER, RERANK_CANDIDATE_FACTOR, ADAPTIVE_RERANK, ADAPTIVE_MAX_FACTOR,
+        EMBED_CACHE_SIZE, EMBED_CACHE_TTL, RERANK_CACHE_SIZE, RERANK_CACHE_TTL,
+        ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL, ANSWER_CACHE_SEMANTIC_THRESHOLD,
+        MICROBATCH_ENABLED, MICROBATCH_MAX_WAIT_MS, MICROBATCH_MAX_EMBED, MICROBATCH_MAX_RERANK_PAIRS,
+        MODEL_WORKERS, WARMUP_ENABLED, OLLAMA_PRELOAD, BATCH_LLM_CONCURRENCY, EXTRACTIVE_ENABLED,
+        CONTEXT_TOKEN_BUDGET
     )
-    from .ollama_client import chat
+    from .ollama_client import chat, chat_async, chat_stream_async, preload, llm_stats
+    from .cache import LRUCache, AnswerCache, normalize_question, text_hash
+    from .embeddings import load_embedder
+    from .vector_store import load_store, SearchOptions, DEFAULT_SEARCH
+    from .reranker import load_reranker
+    from .adaptive import rerank_policy
+    from .batching import MicroBatcher
+    from .context_builder import build_context, load_token_counter
+    from .admission import AdmissionController, INTERACTIVE, BATCH
+    from .extractive import is_confident, extract
+    from .deadline import Deadline, DeadlineExceeded
+    from . import metrics
+    from .profiling import profiled
 except ImportError:
     from config import (
-        EMBEDDING_MODEL, QDRANT_URL, QDRANT_COLLECTION, TOP_K,
-        ENABLE_RERANKER, RERANKER_MODEL
+        TOP_K, ENABLE_RERANKER, RERANK_CANDIDATE_FACTOR, ADAPTIVE_RERANK, ADAPTIVE_MAX_FACTOR,
+        EMBED_CACHE_SIZE, EMBED_CACHE_TTL, RERANK_CACHE_SIZE, RERANK_CACHE_TTL,
+        ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL, ANSWER_CACHE_SEMANTIC_THRESHOLD,
+        MICROBATCH_ENABLED, MICROBATCH_MAX_WAIT_MS, MICROBATCH_MAX_EMBED, MICROBATCH_MAX_RERANK_PAIRS,
+        MODEL_WORKERS, WARMUP_ENABLED, OLLAMA_PRELOAD, BATCH_LLM_CONCURRENCY, EXTRACTIVE_ENABLED,
+        CONTEXT_TOKEN_BUDGET
     )
-    from ollama_client import chat
+    from ollama_client import chat, chat_async, chat_stream_async, preload, llm_stats
+    from cache import LRUCache, AnswerCache, normalize_question, text_hash
+    from embeddings import load_embedder
+    from vector_store import load_store, SearchOptions, DEFAULT_SEARCH
+    from reranker import load_reranker
+    from adaptive import rerank_policy
+    from batching import MicroBatcher
+    from context_builder import build_context, load_token_counter
+    from admission import AdmissionController, INTERACTIVE, BATCH
+    from extractive import is_confident, extract
+    from deadline import Deadline, DeadlineExceeded
+    import metrics
+    from profiling import profiled
 
-def _device():
-    return "cuda" if torch.cuda.is_available() else "cpu"
+# Embedding / reranking run here on the async path, so concurrency is bounded by
+# model capacity rather than by Starlette's threadpool
+model_executor = ThreadPoolExecutor(max_workers=MODEL_WORKERS, thread_name_prefix="model")
 
 class Retriever:
-    def __init__(self):
-        self.embedder = SentenceTransformer(EMBEDDING_MODEL)
-        self.client = QdrantClient(QDRANT_URL)
+    def __init__(self, store=None):
+        self.embedder = load_embedder()
+        self.store = store if store is not None else load_store()
+        self._reopen_lock = threading.Lock()
+        self.embed_cache = LRUCache(EMBED_CACHE_SIZE, EMBED_CACHE_TTL)
+        self._embed_cache_model = self.embedder.model_name
 
-        self.reranker = None
-        if ENABLE_RERANKER:
-            self.reranker = AutoModelForSequenceClassification.from_pretrained(RERANKER_MODEL).to(_device())
-            self.rtok = AutoTokenizer.from_pretrained(RERANKER_MODEL)
+        self.reranker = load_reranker() if ENABLE_RERANKER else None
+        self.rerank_cache = LRUCache(RERANK_CACHE_SIZE, RERANK_CACHE_TTL)
+        self.count_tokens = load_token_counter()
+
+        # Concurrent requests share forward passes instead of running batch-size-1 each
+        self._encode = lambda texts: self.embedder.encode(texts)
+        self._score = self.reranker.score if self.reranker else None
+        self.batchers = {}
+        if MICROBATCH_ENABLED:
+            self._encode = self.batchers["embed"] = MicroBatcher(
+                self._encode, MICROBATCH_MAX_EMBED, MICROBATCH_MAX_WAIT_MS, name="embed-batcher")
+            if self.reranker:
+                self._score = self.batchers["rerank"] = MicroBatcher(
+                    self._score, MICROBATCH_MAX_RERANK_PAIRS, MICROBATCH_MAX_WAIT_MS, name="rerank-batcher")
+
+    def index_version(self):
+        """index_id of the current index; a local index rebuilt on disk is reopened first."""
+        version = self.store.index_version()
+        if self.store.stale(version):
+            self._reopen(version)
+        return version
+
+    async def aindex_version(self):
+        version = await self.store.aindex_version()
+        if self.store.stale(version):
+            await asyncio.to_thread(self._reopen, version)
+        return version
+
+    def _reopen(self, version):
+        with self._reopen_lock:
+            if not self.store.stale(version):
+                return
+            try:
+                store = load_store()
+            except Exception as e:
+                # e.g. caught between the two renames of a swap; the next check retries
+                print(f"[rag] Reopening the index failed, still serving {self.store.loaded_version}: {e!r}")
+                return
+            self.store = store  # searches already running finish on the old files
+            print(f"[rag] Reopened the index: {version}")
+
+    def _embed_key(self, text: str) -> tuple:
+        model = self.embedder.model_name
+        if model != self._embed_cache_model:
+            self.embed_cache.clear()
+            self._embed_cache_model = model
+        return (model, normalize_question(text))
 
     def embed(self, text: str):
-        return self.embedder.encode([text], normalize_embeddings=True)[0].tolist()
+        key = self._embed_key(text)
+        vec = self.embed_cache.get(key)
+        if vec is None:
+            with metrics.stage("embed"):
+                vec = self._encode([text])[0].tolist()
+            self.embed_cache.put(key, vec)
+        return vec
 
-    def search(self, question: str, lang: str | None = None, limit: int = TOP_K):
-        qvec = self.embed(question)
-        pre_limit = max(limit * (3 if self.reranker else 1), limit)
-        flt = None
-        if lang:
-            flt = Filter(must=[FieldCondition(key="lang", match=MatchValue(value=lang))])
-        hits = self.client.search(
-            collection_name=QDRANT_COLLECTION,
-            query_vector=qvec,
-            query_filter=flt,
-            limit=pre_limit,
-        )
+    async def aembed(self, text: str):
+        key = self._embed_key(text)
+        vec = self.embed_cache.get(key)
+        if vec is None:
+            with metrics.stage("embed"):
+                vec = (await self._amodel("embed", self._encode, [text]))[0].tolist()
+            self.embed_cache.put(key, vec)
+        return vec
+
+    async def _amodel(self, name: str, fn, items: list) -> list:
+        """A model call from the event loop. With a batcher the request just waits in its queue,
+        so no thread is held (MODEL_WORKERS would otherwise cap the batch size); else model_executor."""
+        batcher = self.batchers.get(name)
+        if batcher is not None:
+            return await asyncio.wrap_future(batcher.submit(items))
+        return await asyncio.get_running_loop().run_in_executor(model_executor, fn, items)
+
+    def embed_many(self, texts: List[str]) -> List[list]:
+        """Like `embed`, but all cache misses go through the encoder as one batch."""
+        keys = [self._embed_key(t) for t in texts]
+        vecs = [self.embed_cache.get(k) for k in keys]
+        todo = [i for i, v in enumerate(vecs) if v is None]
+        if todo:
+            with metrics.stage("embed"):
+                encoded = self._encode([texts[i] for i in todo])
+            for i, v in zip(todo, encoded):
+                vecs[i] = v.tolist()
+                self.embed_cache.put(keys[i], vecs[i])
+        return vecs
+
+    def warmup(self):
+        # First real forward passes are slow (allocation, kernel selection); pay that at startup
+        self._encode(["warmup"])
+        if self._score:
+            self._score([("warmup", "warmup")])
+
+    def cache_stats(self) -> dict:
+        return {"embedding": self.embed_cache.stats(), "rerank": self.rerank_cache.stats()}
+
+    def batcher_stats(self) -> dict:
+        return {name: b.stats() for name, b in self.batchers.items()}
+
+    def _pre_limit(self, limit: int) -> int:
+        return max(limit * (RERANK_CANDIDATE_FACTOR if self.reranker else 1), limit)
+
+    def _policy(self, hits, limit: int, adaptive: bool | None, info: dict | None) -> tuple[bool, bool]:
+        """Returns (rerank, grow) for the first candidate pool."""
+        rerank = bool(self.reranker and hits)
+        grow = False
+        if rerank and (ADAPTIVE_RERANK if adaptive is None else adaptive):
+            policy = rerank_policy([h.score for h in hits], limit)
+            rerank = policy != "skip"
+            grow = policy == "grow"
+            if info is not None:
+                info["rerank_policy"] = policy
+        return rerank, grow
+
+    @staticmethod
+    def _rank(hits, scores: List[float] | None, limit: int):
         docs = [h.payload for h in hits]
+        if scores is None:
+            return docs[:limit]
+        ranked = sorted(zip(docs, scores), key=lambda x: x[1], reverse=True)[:limit]
+        return [d for d, s in ranked]
 
-        if self.reranker and docs:
-            pairs = [(question, d["content"]) for d in docs]
-            scores = self._rerank(pairs)
-            ranked = sorted(zip(docs, scores), key=lambda x: x[1], reverse=True)[:limit]
-            docs = [d for d, s in ranked]
-        else:
-            docs = docs[:limit]
-
-        context = ""
-        for i, d in enumerate(docs, start=1):
-            snippet = d["content"][:1200].replace("\n", " ")
-            context += f"\n[{i}] {d['url']}\n{snippet}\n"
-        return docs, context
-
-    def _rerank(self, pairs: List[tuple[str,str]]):
-        toks = self.rtok([p[0] for p in pairs], [p[1] for p in pairs], padding=True, truncation=True, return_tensors="pt").to(_device())
-        with torch.no_grad():
-            out = self.reranker(**toks).logits.squeeze(-1)
-            scores = out.detach().cpu().tolist()
-        if isinstance(scores, float): scores = [scores]
+    def _select(self, question: str, hits, limit: int, rerank: bool, info: dict | None):
+        scores = self._rerank(question, hits) if rerank else None
+        return self._selected(hits, scores, limit, rerank, info)
+
+    async def _aselect(self, question: str, hits, limit: int, rerank: bool, info: dict | None):
+        scores = await self._arerank(question, hits) if rerank else None
+        return self._selected(hits, scores, limit, rerank, info)
+
+    def _selected(self, hits, scores: List[float] | None, limit: int, rerank: bool, info: dict | None):
+        docs = self._rank(hits, scores, limit)
+        if info is not None:
+            info["candidates"] = len(hits)
+            info["reranked"] = rerank
+            if scores:
+                info["top_scores"] = sorted((float(s) for s in scores), reverse=True)[:2]
+        return docs
+
+    def extract(self, question: str, docs, info: dict) -> str | None:
+        """Extractive answer from the top doc, when the reranker scores in `info` are decisive."""
+        if not self._score or not docs or not is_confident(info.get("top_scores")):
+            return None
+        with metrics.stage("extract"):
+            return extract(question, docs[0], self._score)
+
+    def _context(self, docs, deadline: Deadline | None = None):
+        """Packs docs into the prompt; returns (cited docs, context) with [i] == cited[i-1]."""
+        budget = CONTEXT_TOKEN_BUDGET if deadline is None else deadline.context_budget(CONTEXT_TOKEN_BUDGET)
+        with metrics.stage("context"):
+            context, cited = build_context(docs, self.count_tokens, budget)
+        return cited, context
+
+    @staticmethod
+    def _note_search(info: dict | None, opts: SearchOptions, t0: float):
+        dt = time.perf_counter() - t0
+        metrics.observe("search", dt)
+        if info is not None:
+            info["params"] = opts.as_dict()
+            info["store_ms"] = round(info.get("store_ms", 0.0) + dt * 1000, 2)
+
+    def search(self, question: str, lang: str | None = None, limit: int = TOP_K,
+               adaptive: bool | None = None, info: dict | None = None,
+               opts: SearchOptions = DEFAULT_SEARCH, deadline: Deadline | None = None):
+        """`deadline`, if given, may skip reranking and shrink the context to fit the time left."""
+        qvec = self.embed(question)
+        t0 = time.perf_counter()
+        hits = self.store.search(qvec, lang=lang, limit=self._pre_limit(limit), opts=opts)
+        self._note_search(info, opts, t0)
+        rerank, grow = self._policy(hits, limit, adaptive, info)
+        if grow:
+            t0 = time.perf_counter()
+            hits = self.store.search(qvec, lang=lang, limit=limit * ADAPTIVE_MAX_FACTOR, opts=opts)
+            self._note_search(info, opts, t0)
+        if rerank and deadline is not None:
+            rerank = deadline.allows_rerank()
+        docs = self._select(question, hits, limit, rerank, info)
+        return self._context(docs, deadline)
+
+    async def asearch(self, question: str, lang: str | None = None, limit: int = TOP_K,
+                      adaptive: bool | None = None, info: dict | None = None,
+                      opts: SearchOptions = DEFAULT_SEARCH, deadline: Deadline | None = None):
+        """`search` for the event loop: Qdrant I/O is awaited, model work goes through `_amodel`."""
+        qvec = await self.aembed(question)
+        t0 = time.perf_counter()
+        hits = await self.store.asearch(qvec, lang=lang, limit=self._pre_limit(limit), opts=opts)
+        self._note_search(info, opts, t0)
+        rerank, grow = self._policy(hits, limit, adaptive, info)
+        if grow:
+            t0 = time.perf_counter()
+            hits = await self.store.asearch(qvec, lang=lang, limit=limit * ADAPTIVE_MAX_FACTOR, opts=opts)
+            self._note_search(info, opts, t0)
+        if rerank and deadline is not None:
+            rerank = deadline.allows_rerank()
+        docs = await self._aselect(question, hits, limit, rerank, info)
+        return self._context(docs, deadline)
+
+    def search_many(self, questions: List[str], lang: str | None = None, limit: int = TOP_K,
+                    adaptive: bool | None = None, opts: SearchOptions = DEFAULT_SEARCH):
+        """Batch `search`: one encoder pass, one batched vector search, one reranker pass."""
+        qvecs = self.embed_many(questions)
+        with metrics.stage("search"):
+            hits_lists = self.store.search_batch(qvecs, lang=lang, limit=self._pre_limit(limit), opts=opts)
+        rerank_idx = []
+        for i, hits in enumerate(hits_lists):
+            rerank, grow = self._policy(hits, limit, adaptive, None)
+            if grow:
+                hits_lists[i] = self.store.search(qvecs[i], lang=lang, limit=limit * ADAPTIVE_MAX_FACTOR, opts=opts)
+            if rerank:
+                rerank_idx.append(i)
+        scores = [None] * len(questions)
+        for i, sc in zip(rerank_idx, self._rerank_many([questions[i] for i in rerank_idx],
+                                                       [hits_lists[i] for i in rerank_idx])):
+            scores[i] = sc
+        return [self._context(self._rank(h, sc, limit)) for h, sc in zip(hits_lists, scores)]
+
+    def _rerank(self, question: str, hits) -> List[float]:
+        return self._rerank_many([question], [hits])[0]
+
+    async def _arerank(self, question: str, hits) -> List[float]:
+        keys, scores, todo, pairs = self._rerank_lookup([question], [hits])
+        if todo:
+            with metrics.stage("rerank"):
+                fresh = await self._amodel("rerank", self._score, pairs)
+            self._rerank_store(keys, scores, todo, fresh)
+        return scores[0]
+
+    def _rerank_many(self, questions: List[str], hits_lists) -> List[List[float]]:
+        """Scores every (question, hit) pair; uncached pairs of all questions share one model call."""
+        if not questions:
+            return []
+        keys, scores, todo, pairs = self._rerank_lookup(questions, hits_lists)
+        if todo:
+            with metrics.stage("rerank"):
+                fresh = self._score(pairs)
+            self._rerank_store(keys, scores, todo, fresh)
         return scores
 
-retriever = Retriever()
+    def _rerank_lookup(self, questions: List[str], hits_lists):
+        """Cached scores per question, plus the (question, content) pairs still to score."""
+        keys, scores, todo = [], [], []
+        for qi, (question, hits) in enumerate(zip(questions, hits_lists)):
+            qhash = text_hash(normalize_question(question))
+            ks = [(qhash, h.id, h.payload.get("content_hash") or text_hash(h.payload["content"]),
+                   self.reranker.model_name) for h in hits]
+            ss = [self.rerank_cache.get(k) for k in ks]
+            todo += [(qi, hi) for hi, sc in enumerate(ss) if sc is None]
+            keys.append(ks)
+            scores.append(ss)
+        pairs = [(questions[qi], hits_lists[qi][hi].payload["content"]) for qi, hi in todo]
+        return keys, scores, todo, pairs
+
+    def _rerank_store(self, keys, scores, todo, fresh):
+        for (qi, hi), sc in zip(todo, fresh):
+            scores[qi][hi] = sc
+            self.rerank_cache.put(keys[qi][hi], sc)
+
+retriever: Retriever | None = None
+_load_lock = threading.Lock()
+state = {"status": "idle", "error": None, "load_seconds": None, "ollama_preloaded": False}
+
+def load(store=None):
+    """Build the Retriever (models + store), warm it up and preload the Ollama model.
+    `store` replaces the one load_store() would open (benchmark.py)."""
+    global retriever
+    with _load_lock:
+        if retriever is not None:
+            return retriever
+        state.update(status="loading", error=None)
+        t0 = time.time()
+        try:
+            r = Retriever(store)
+            if WARMUP_ENABLED:
+                r.warmup()
+        except BaseException as e:  # whatever it was, /readyz must not say "loading" forever
+            state.update(status="failed", error=repr(e))
+            raise
+        retriever = r
+        state.update(status="ready", load_seconds=round(time.time() - t0, 2))
+        if OLLAMA_PRELOAD:
+            try:
+                preload()
+                state["ollama_preloaded"] = True
+            except Exception as e:
+                # Not fatal: the first generation will load the model instead
+                print(f"[rag] Ollama preload failed: {e!r}")
+        return retriever
+
+def start_background_load() -> threading.Thread:
+    def run():
+        try:
+            load()
+        except BaseException as e:
+            print(f"[rag] Model loading failed: {e!r}")
+    t = threading.Thread(target=run, name="model-loader", daemon=True)
+    t.start()
+    return t
+
+def is_ready() -> bool:
+    return retriever is not None
+
+def get_retriever() -> Retriever:
+    """The loaded Retriever; loads it synchronously for scripts that never called start_background_load()."""
+    return retriever if retriever is not None else load()
+
+def readiness() -> dict:
+    ready = retriever is not None
+    store_ok = ready and retriever.store.ping()
+    return {**state, "models_loaded": ready, "store_reachable": store_ok, "ready": ready and store_ok}
+
+# Shared by every generation: interactive requests queue ahead of batch ones
+admission = AdmissionController()
+
+def _extractive(requested: bool | None) -> bool:
+    return EXTRACTIVE_ENABLED if requested is None else requested
+
+def _cacheable(search: dict | None, extractive: bool | None) -> bool:
+    # Cached answers are default-path answers; tuned search or a non-default path may answer differently
+    return not search and _extractive(extractive) == EXTRACTIVE_ENABLED
+
+async def _aextract(retriever: Retriever, question: str, docs, info: dict) -> str | None:
+    if not is_confident(info.get("top_scores")):
+        return None
+    return await asyncio.get_running_loop().run_in_executor(model_executor, retriever.extract, question, docs, info)
+
+answer_cache = AnswerCache(ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL, ANSWER_CACHE_SEMANTIC_THRESHOLD)
+
+# Returned when the deadline passes before the LLM has produced anything
+TIMEOUT_ANSWER = "Sorry, I couldn't finish an answer in time. The most relevant sources are listed below."
+
+def _store(question: str, lang: str | None, top_k: int, docs, text: str, qvec, cache: bool = True,
+           path: str = "llm") -> dict:
+    res = {"answer": text, "sources": [d["url"] for d in docs], "path": path}
+    if cache:
+        answer_cache.put(question, lang, top_k, res, qvec)
+    return {**res, "cached": False}
+
+def _finish(res: dict, debug: bool, info: dict, llm: dict | None = None,
+            deadline: Deadline | None = None) -> dict:
+    res["degraded"] = list(deadline.degraded) if deadline is not None else []
+    if debug:
+        res["debug"] = {"search": info, "llm": llm or {}}
+        if deadline is not None:
+            res["debug"]["deadline"] = deadline.as_dict()
+    return res
+
+def _timed_out(e: DeadlineExceeded, deadline: Deadline) -> tuple[str, str]:
+    """(answer text, path) for a generation cut off by the deadline."""
+    if e.partial:
+        deadline.note("truncated")
+        return e.partial, "llm"
+    deadline.note("timed_out")
+    return TIMEOUT_ANSWER, "timeout"
+
+def _llm_wait(deadline: Deadline) -> float:
+    return min(admission.max_wait, deadline.remaining())
+
+@profiled
+def answer(question: str, lang: str | None = None, top_k: int = TOP_K, search: dict | None = None,
+           debug: bool = False, extractive: bool | None = None, deadline_ms: int | None = None) -> dict:
+    """`search` overrides the SEARCH_* defaults for this call (see SearchOptions);
+    `debug` adds the effective search parameters and store timing to the response.
+    `extractive` (default EXTRACTIVE_ENABLED) allows answering without the LLM;
+    the response's "path" says whether the answer is "extractive" or from the "llm".
+    `deadline_ms` (default REQUEST_DEADLINE_SECONDS) bounds the whole call; stages
+    that had to cut back to meet it are listed in "degraded".
+    `profile=True` records a sampling profile when PROFILE_ENABLED (see profiling.py)."""
+    with metrics.request("ask", lang) as req:
+        deadline = Deadline.from_request(deadline_ms)
+        retriever = get_retriever()
+        answer_cache.sync(retriever.index_version())
+        # Answers cached under the default search parameters don't apply to tuned ones
+        use_cache = _cacheable(search, extractive)
+        hit = answer_cache.get(question, lang, top_k) if use_cache else None
+        qvec = None
+        if hit is None and use_cache and answer_cache.semantic_threshold > 0:
+            qvec = retriever.embed(question)
+            hit = answer_cache.get_similar(qvec, lang, top_k)
+        if hit is not None:
+            return req.done(_finish({**hit, "cached": True}, debug, {}))
+
+        info = {}
+        docs, ctx = retriever.search(question, lang=lang, limit=top_k, info=info,
+                                     opts=SearchOptions.from_dict(search), deadline=deadline)
+        text = retriever.extract(question, docs, info) if _extractive(extractive) else None
+        if text is not None:
+            return req.done(_finish(_store(question, lang, top_k, docs[:1], text, qvec, use_cache, "extractive"),
+                                    debug, info, deadline=deadline))
+        llm, path = {}, "llm"
+        try:
+            with admission.slot(INTERACTIVE, _llm_wait(deadline)), metrics.stage("llm"):
+                text = chat(question, ctx, llm, deadline)
+        except DeadlineExceeded as e:
+            text, path = _timed_out(e, deadline)
+        # Answers degraded by the deadline are not worth caching
+        res = _store(question, lang, top_k, docs, text, qvec, use_cache and deadline.complete(), path)
+        return req.done(_finish(res, debug, info, llm, deadline))
+
+@profiled
+async def answer_async(question: str, lang: str | None = None, top_k: int = TOP_K, search: dict | None = None,
+                       debug: bool = False, extractive: bool | None = None, deadline_ms: int | None = None) -> dict:
+    with metrics.request("ask", lang) as req:
+        deadline = Deadline.from_request(deadline_ms)
+        retriever = get_retriever()
+        answer_cache.sync(await retriever.aindex_version())
+        use_cache = _cacheable(search, extractive)
+        hit = answer_cache.get(question, lang, top_k) if use_cache else None
+        qvec = None
+        if hit is None and use_cache and answer_cache.semantic_threshold > 0:
+            qvec = await retriever.aembed(question)
+            hit = answer_cache.get_similar(qvec, lang, top_k)
+        if hit is not None:
+            return req.done(_finish({**hit, "cached": True}, debug, {}))
+
+        info = {}
+        docs, ctx = await retriever.asearch(question, lang=lang, limit=top_k, info=info,
+                                            opts=SearchOptions.from_dict(search), deadline=deadline)
+        text = await _aextract(retriever, question, docs, info) if _extractive(extractive) else None
+        if text is not None:
+            return req.done(_finish(_store(question, lang, top_k, docs[:1], text, qvec, use_cache, "extractive"),
+                                    debug, info, deadline=deadline))
+        llm, path = {}, "llm"
+        try:
+            async with admission.aslot(INTERACTIVE, _llm_wait(deadline)):
+                with metrics.stage("llm"):
+                    text = await chat_async(question, ctx, llm, deadline)
+        except DeadlineExceeded as e:
+            text, path = _timed_out(e, deadline)
+        res = _store(question, lang, top_k, docs, text, qvec, use_cache and deadline.complete(), path)
+        return req.done(_finish(res, debug, info, llm, deadline))
+
+async def answer_stream(question: str, lang: str | None = None, top_k: int = TOP_K, search: dict | None = None,
+                        extractive: bool | None = None,
+                        deadline_ms: int | None = None) -> AsyncIterator[tuple[str, dict]]:
+    """Streams an answer as (event, data) pairs: "sources" once retrieval is done,
+    then "token" deltas as Ollama generates, then "done" with timings
+    (ttft_ms is measured from the start of the request to the first token)."""
+    with metrics.request("stream", lang) as req:
+        deadline = Deadline.from_request(deadline_ms)
+        t0 = time.perf_counter()
+        ms = lambda: round((time.perf_counter() - t0) * 1000, 1)
+        retriever = get_retriever()
+        answer_cache.sync(await retriever.aindex_version())
+        use_cache = _cacheable(search, extractive)
+        hit = answer_cache.get(question, lang, top_k) if use_cache else None
+        if hit is not None:
+            req.status = "cached"
+            yield "sources", {"sources": hit["sources"], "cached": True}
+            yield "token", {"text": hit["answer"]}
+            yield "done", {"cached": True, "path": hit.get("path"), "ttft_ms": ms(), "total_ms": ms(), "degraded": []}
+            return
+
+        info = {}
+        docs, ctx = await retriever.asearch(question, lang=lang, limit=top_k, info=info,
+                                            opts=SearchOptions.from_dict(search), deadline=deadline)
+        text = await _aextract(retriever, question, docs, info) if _extractive(extractive) else None
+        if text is not None:
+            res = _store(question, lang, top_k, docs[:1], text, None, use_cache, "extractive")
+            req.done({**res, "degraded": deadline.degraded})
+            yield "sources", {"sources": res["sources"], "cached": False, "retrieval_ms": ms()}
+            yield "token", {"text": text}
+            yield "done", {"cached": False, "path": "extractive", "ttft_ms": ms(), "total_ms": ms(),
+                           "degraded": list(deadline.degraded)}
+            return
+
+        # Admitted before the first event, so a saturated server can still answer with a 429
+        async with admission.aslot(INTERACTIVE, _llm_wait(deadline)):
+            yield "sources", {"sources": [d["url"] for d in docs], "cached": False, "retrieval_ms": ms()}
+            parts, ttft, llm, path = [], None, {}, "llm"
+            try:
+                with metrics.stage("llm"):
+                    async for text in chat_stream_async(question, ctx, llm, deadline):
+                        if ttft is None:
+                            ttft = ms()
+                            metrics.ttft(ttft / 1000)
+                        parts.append(text)
+                        yield "token", {"text": text}
+            except DeadlineExceeded as e:
+                text, path = _timed_out(e, deadline)
+                if path == "timeout":
+                    parts = [text]
+                    yield "token", {"text": text}
+            except Exception as e:
+                req.status = "error"
+                yield "error", {"error": repr(e)}
+                return
+        res = _store(question, lang, top_k, docs, "".join(parts), None, use_cache and deadline.complete(), path)
+        req.done({**res, "degraded": deadline.degraded})
+        yield "done", {"cached": False, "path": path, "ttft_ms": ttft, "total_ms": ms(),
+                       "degraded": list(deadline.degraded), **llm}
+
+def answer_batch(questions: List[str], lang: str | None = None, top_k: int = TOP_K,
+                 concurrency: int = BATCH_LLM_CONCURRENCY) -> Iterator[dict]:
+    """Answers many questions, yielding {"index", "question", ...answer} as each one completes.
+
+    Retrieval is shared: one embedding batch, one batched vector search and one
+    reranker pass. Generations run with at most `concurrency` in flight.
+    """
+    retriever = get_retriever()
+    answer_cache.sync(retriever.index_version())
+    todo = []
+    for i, q in enumerate(questions):
+        hit = answer_cache.get(q, lang, top_k)
+        if hit is not None:
+            metrics.count("batch", lang, "cached")
+            yield {"index": i, "question": q, **hit, "cached": True}
+        else:
+            todo.append(i)
+    if not todo:
+        return
+
+    retrieved = retriever.search_many([questions[i] for i in todo], lang=lang, limit=top_k)
+
+    def generate(i, docs, ctx):
+        try:
+            with metrics.request("batch", lang) as req:
+                # Batch work waits as long as it takes, behind any interactive request
+                with admission.slot(BATCH, max_wait=None), metrics.stage("llm"):
+                    text = chat(questions[i], ctx)
+                res = req.done(_store(questions[i], lang, top_k, docs, text, None))
+        except Exception as e:
+            res = {"error": repr(e), "sources": [d["url"] for d in docs]}
+        return {"index": i, "question": questions[i], **res}
+
+    pool = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="batch-llm")
+    try:
+        futs = [pool.submit(generate, i, docs, ctx) for i, (docs, ctx) in zip(todo, retrieved)]
+        for f in as_completed(futs):
+            yield f.result()
+    finally:
+        # Closed early (client disconnected): drop the queued generations, don't wait for running ones
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def admission_stats() -> dict:
+    return admission.stats()
+
+def batcher_stats() -> dict:
+    return retriever.batcher_stats() if retriever is not None else {}
+
+def cache_stats() -> dict:
+    models = retriever.cache_stats() if retriever is not None else {}
+    return {**models, "answer": answer_cache.stats()}
 
-def answer(question: str, lang: str | None = None, top_k: int = TOP_K) -> dict:
-    docs, ctx = retriever.search(question, lang=lang, limit=top_k)
-    text = chat(question, ctx)
-    sources = [d["url"] for d in docs]
-    return {"answer": text, "sources": sources}
+metrics.watch(caches=cache_stats, admission=admission_stats, llm=llm_stats, batchers=batcher_stats)
@@ -0,0 +1,205 @@
+"""Cross-encoder reranking engine tuned for CPU serving.
+
+Compared with scoring every candidate in one padded batch, the engine
+
+  * caps the sequence length at RERANKER_MAX_LENGTH and pre-truncates document
+    text to the character window that can actually be scored,
+  * sorts pairs by length and scores them in RERANKER_BATCH_SIZE batches so
+    padding stays small,
+  * resolves the device once, and
+  * can run a dynamically int8-quantized torch model or an int8 ONNX export
+    (RERANKER_BACKEND = torch | int8 | onnx).
+
+RERANKER_BACKEND=overlap scores word overlap instead of running a model, for
+offline benchmarks.
+
+  python -m src.reranker export    # ONNX export for RERANKER_BACKEND=onnx
+  python -m src.reranker parity    # compare against the fp32 full-length scores
+"""
+import os, re, sys, time, json
+from typing import List, Tuple
+import numpy as np
+
+try:
+    from .config import (
+        RERANKER_MODEL, RERANKER_BACKEND, RERANKER_MAX_LENGTH, RERANKER_BATCH_SIZE,
+        RERANKER_ONNX_DIR, RERANKER_PARITY_MIN_SPEARMAN, OUTPUT_JSONL
+    )
+    from .embeddings import FP32_FILE, INT8_FILE, DEFAULT_PARITY_TEXTS
+except ImportError:
+    from config import (
+        RERANKER_MODEL, RERANKER_BACKEND, RERANKER_MAX_LENGTH, RERANKER_BATCH_SIZE,
+        RERANKER_ONNX_DIR, RERANKER_PARITY_MIN_SPEARMAN, OUTPUT_JSONL
+    )
+    from embeddings import FP32_FILE, INT8_FILE, DEFAULT_PARITY_TEXTS
+
+# Generous upper bound on characters per token, so pre-truncation never cuts
+# text the tokenizer would still have kept.
+CHARS_PER_TOKEN = 6
+
+class CrossEncoderReranker:
+    def __init__(self, model_name: str = RERANKER_MODEL, backend: str = RERANKER_BACKEND,
+                 max_length: int = RERANKER_MAX_LENGTH, batch_size: int = RERANKER_BATCH_SIZE):
+        from transformers import AutoTokenizer
+        self.model_name = model_name
+        self.backend = backend
+        self.max_length = max_length
+        self.batch_size = batch_size
+        self.max_chars = max_length * CHARS_PER_TOKEN
+
+        if backend == "onnx":
+            import onnxruntime as ort
+            path = os.path.join(RERANKER_ONNX_DIR, INT8_FILE)
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"Missing ONNX reranker: {path}. Run `python -m src.reranker export` first.")
+            self.tokenizer = AutoTokenizer.from_pretrained(RERANKER_ONNX_DIR)
+            opts = ort.SessionOptions()
+            opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            self.session = ort.InferenceSession(path, sess_options=opts, providers=["CPUExecutionProvider"])
+            self.input_names = {i.name for i in self.session.get_inputs()}
+            self.device = "cpu"
+            return
+
+        import torch
+        from transformers import AutoModelForSequenceClassification
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModelForSequenceClassification.from_pretrained(model_name).eval()
+        if backend == "int8":
+            # Dynamic quantization is CPU-only
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+            self.device = "cpu"
+        elif backend == "torch":
+            self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        else:
+            raise ValueError(f"Unknown RERANKER_BACKEND: {backend}")
+        self.model = model.to(self.device)
+
+    def _forward(self, queries: List[str], docs: List[str]) -> List[float]:
+        # longest_first trims the document as before, but also a question that alone exceeds
+        # max_length ("only_second" raises on those)
+        toks = self.tokenizer(queries, docs, padding=True, truncation="longest_first",
+                              max_length=self.max_length,
+                              return_tensors="np" if self.backend == "onnx" else "pt")
+        if self.backend == "onnx":
+            feed = {k: v.astype(np.int64) for k, v in toks.items() if k in self.input_names}
+            return self.session.run(None, feed)[0].reshape(-1).tolist()
+        import torch
+        with torch.inference_mode():
+            logits = self.model(**toks.to(self.device)).logits
+        return logits.reshape(-1).float().cpu().tolist()
+
+    def score(self, pairs: List[Tuple[str, str]]) -> List[float]:
+        if not pairs:
+            return []
+        pairs = [(q[:self.max_chars], d[:self.max_chars]) for q, d in pairs]
+        order = sorted(range(len(pairs)), key=lambda i: len(pairs[i][0]) + len(pairs[i][1]))
+        scores = [0.0] * len(pairs)
+        for i in range(0, len(order), self.batch_size):
+            idx = order[i:i+self.batch_size]
+            out = self._forward([pairs[j][0] for j in idx], [pairs[j][1] for j in idx])
+            for j, s in zip(idx, out):
+                scores[j] = s
+        return scores
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+class OverlapReranker:
+    """Counts question words found in the document; stands in for the cross-encoder without weights."""
+    backend = "overlap"
+
+    def __init__(self, model_name: str = "word-overlap"):
+        self.model_name = model_name
+
+    def score(self, pairs: List[Tuple[str, str]]) -> List[float]:
+        out = []
+        for q, d in pairs:
+            words = set(_WORD_RE.findall(d.lower()))
+            out.append(float(sum(1 for w in set(_WORD_RE.findall(q.lower())) if w in words)))
+        return out
+
+def load_reranker(backend: str = RERANKER_BACKEND):
+    if backend == "overlap":
+        return OverlapReranker()
+    return CrossEncoderReranker(backend=backend)
+
+def export_onnx(model_name: str = RERANKER_MODEL, model_dir: str = RERANKER_ONNX_DIR):
+    import torch
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    os.makedirs(model_dir, exist_ok=True)
+    print(f"[reranker] Exporting {model_name} -> {model_dir}")
+    tok = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModelForSequenceClassification.from_pretrained(model_name).eval()
+    tok.save_pretrained(model_dir)
+
+    sample = tok(["query"], ["document"], return_tensors="pt")
+    names = list(sample.keys())
+    axes = {n: {0: "batch", 1: "seq"} for n in names}
+    axes["logits"] = {0: "batch"}
+    fp32 = os.path.join(model_dir, FP32_FILE)
+    with torch.no_grad():
+        torch.onnx.export(model, tuple(sample[n] for n in names), fp32, input_names=names,
+                          output_names=["logits"], dynamic_axes=axes, opset_version=17)
+    int8 = os.path.join(model_dir, INT8_FILE)
+    quantize_dynamic(fp32, int8, weight_type=QuantType.QInt8)
+    print(f"[reranker] Wrote {int8}")
+
+def _spearman(a: List[float], b: List[float]) -> float:
+    if len(a) < 2:
+        return 1.0
+    ra = np.argsort(np.argsort(a)).astype(np.float64)
+    rb = np.argsort(np.argsort(b)).astype(np.float64)
+    return float(np.corrcoef(ra, rb)[0, 1])
+
+def _parity_pairs(n_docs: int = 18) -> List[List[Tuple[str, str]]]:
+    docs = []
+    if os.path.exists(OUTPUT_JSONL):
+        with open(OUTPUT_JSONL, "r", encoding="utf-8") as f:
+            for _, line in zip(range(n_docs), f):
+                docs.append(json.loads(line)["content"])
+    if not docs:
+        docs = DEFAULT_PARITY_TEXTS * 3
+    return [[(q, d) for d in docs] for q in DEFAULT_PARITY_TEXTS]
+
+def parity(backend: str = RERANKER_BACKEND, min_spearman: float = RERANKER_PARITY_MIN_SPEARMAN) -> dict:
+    """Compare the engine against the fp32 full-length reference, one query's candidates at a time."""
+    ref = CrossEncoderReranker(backend="torch", max_length=512, batch_size=10_000)
+    ref.max_chars = None
+    eng = CrossEncoderReranker(backend=backend)
+    groups = _parity_pairs()
+    rhos, top1, diffs = [], 0, []
+    t_ref = t_eng = 0.0
+    for pairs in groups:
+        t0 = time.perf_counter(); a = ref.score(pairs); t_ref += time.perf_counter() - t0
+        t0 = time.perf_counter(); b = eng.score(pairs); t_eng += time.perf_counter() - t0
+        rhos.append(_spearman(a, b))
+        top1 += int(np.argmax(a) == np.argmax(b))
+        diffs.append(float(np.max(np.abs(np.asarray(a) - np.asarray(b)))))
+    return {
+        "backend": backend,
+        "max_length": eng.max_length,
+        "queries": len(groups),
+        "min_spearman": min(rhos),
+        "top1_agreement": top1 / len(groups),
+        "max_abs_diff": max(diffs),
+        "threshold": min_spearman,
+        "ok": min(rhos) >= min_spearman,
+        "reference_ms_per_query": t_ref * 1000 / len(groups),
+        "engine_ms_per_query": t_eng * 1000 / len(groups),
+    }
+
+if __name__ == "__main__":
+    cmd = sys.argv[1] if len(sys.argv) > 1 else ""
+    if cmd == "export":
+        export_onnx()
+    elif cmd == "parity":
+        try:
+            rep = parity(sys.argv[2] if len(sys.argv) > 2 else RERANKER_BACKEND)
+        except FileNotFoundError as e:
+            raise SystemExit(str(e))
+        print(json.dumps(rep, indent=2))
+        if not rep["ok"]:
+            raise SystemExit(f"[reranker] Parity check failed: min spearman {rep['min_spearman']:.3f} < {rep['threshold']}")
+    else:
+        raise SystemExit("usage: python -m src.reranker export | parity [torch|int8|onnx]")
@@ -0,0 +1,154 @@
+"""Versioned index snapshots for warm starts.
+
+A snapshot is a local index directory (see vector_store) plus `manifest.json`,
+and `ids.json` when the Qdrant point ids are not simply 0..count-1:
+
+  format, version   "htu-index-snapshot", SNAPSHOT_VERSION
+  model, dim        embedding model the vectors were produced with
+  count, distance   number of points, Qdrant distance
+  corpus_hash       sha256 of the corpus JSONL that was embedded
+  index_id          unique id of the indexing run (changes on every re-index)
+
+The same manifest is stored in the `<collection>-meta` Qdrant collection
+whenever the indexer or an import writes the collection, so exports can
+carry it along and the API can tell when the collection was rebuilt.
+
+  python -m src.indexer_qdrant --export-snapshot data/snapshots/htu
+  python -m src.indexer_qdrant --import-snapshot data/snapshots/htu
+"""
+import os, json, time, uuid, hashlib
+from typing import Dict, Iterator, Optional
+import numpy as np
+
+try:
+    from .config import (
+        EMBEDDING_MODEL, QDRANT_COLLECTION, SNAPSHOT_UPLOAD_BATCH, SNAPSHOT_UPLOAD_PARALLEL
+    )
+    from .vector_store import write_local_index, store_qdrant_manifest, load_qdrant_manifest
+except ImportError:
+    from config import (
+        EMBEDDING_MODEL, QDRANT_COLLECTION, SNAPSHOT_UPLOAD_BATCH, SNAPSHOT_UPLOAD_PARALLEL
+    )
+    from vector_store import write_local_index, store_qdrant_manifest, load_qdrant_manifest
+
+SNAPSHOT_FORMAT = "htu-index-snapshot"
+SNAPSHOT_VERSION = 1
+MANIFEST = "manifest.json"
+IDS = "ids.json"
+
+def corpus_hash(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def make_manifest(dim: int, count: int, corpus_sha: Optional[str], model: str = EMBEDDING_MODEL,
+                  distance: str = "Cosine") -> Dict:
+    return {
+        "format": SNAPSHOT_FORMAT,
+        "version": SNAPSHOT_VERSION,
+        "model": model,
+        "dim": dim,
+        "count": count,
+        "distance": distance,
+        "corpus_hash": corpus_sha,
+        "index_id": uuid.uuid4().hex,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
+
+def write_manifest(path: str, manifest: Dict):
+    with open(os.path.join(path, MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+def read_manifest(path: str) -> Dict:
+    p = os.path.join(path, MANIFEST)
+    if not os.path.exists(p):
+        raise SystemExit(f"Not a snapshot (missing {MANIFEST}): {path}")
+    with open(p, "r", encoding="utf-8") as f:
+        m = json.load(f)
+    if m.get("format") != SNAPSHOT_FORMAT or m.get("version", 0) > SNAPSHOT_VERSION:
+        raise SystemExit(f"Unsupported snapshot format {m.get('format')} v{m.get('version')} in {path}")
+    return m
+
+def export_snapshot(client, out_dir: str, collection: str = QDRANT_COLLECTION) -> Dict:
+    """Dump every point of the collection (vectors + payloads) into `out_dir`."""
+    os.makedirs(out_dir, exist_ok=True)
+    info = client.get_collection(collection)
+    dim = info.config.params.vectors.size
+    distance = info.config.params.vectors.distance.value
+    count = client.count(collection_name=collection, exact=True).count
+    vectors = np.zeros((count, dim), dtype=np.float32)
+    payloads = [None] * count
+    ids = []
+    offset, n = None, 0
+    while True:
+        pts, offset = client.scroll(collection_name=collection, limit=1024, offset=offset,
+                                    with_payload=True, with_vectors=True)
+        for p in pts:
+            if n >= count:
+                raise SystemExit(f"Collection {collection} grew during export; retry.")
+            vectors[n] = p.vector
+            payloads[n] = p.payload
+            ids.append(p.id)
+            n += 1
+        print(f"[snapshot] Exported {n}/{count}")
+        if offset is None:
+            break
+    vectors, payloads = vectors[:n], payloads[:n]
+
+    prev = load_qdrant_manifest(client, collection) or {}
+    manifest = make_manifest(dim, n, prev.get("corpus_hash"), model=prev.get("model", EMBEDDING_MODEL),
+                             distance=distance)
+    manifest["index_id"] = prev.get("index_id", manifest["index_id"])
+    write_local_index(out_dir, vectors, payloads, model=prev.get("model", EMBEDDING_MODEL), hnsw=False,
+                      manifest=manifest)
+    if ids != list(range(n)):
+        # Local index rows are positional; keep the original ids (ints or UUID strings) next to them
+        with open(os.path.join(out_dir, IDS), "w", encoding="utf-8") as f:
+            json.dump(ids, f)
+    print(f"[snapshot] Wrote {out_dir} ({n} points, dim {dim})")
+    return manifest
+
+def _payloads(path: str, count: int) -> Iterator[Dict]:
+    with open(os.path.join(path, "payloads.jsonl"), "r", encoding="utf-8") as f:
+        for _, line in zip(range(count), f):
+            yield json.loads(line)
+
+def _ids(path: str, count: int) -> list:
+    p = os.path.join(path, IDS)
+    if not os.path.exists(p):
+        return list(range(count))
+    with open(p, "r", encoding="utf-8") as f:
+        ids = json.load(f)
+    if (not isinstance(ids, list) or len(ids) != count
+            or not all(isinstance(i, (int, str)) and not isinstance(i, bool) for i in ids)):
+        raise SystemExit(f"Bad {IDS} in {path}: expected {count} integer or UUID ids")
+    return ids
+
+def import_snapshot(client, path: str, collection: str = QDRANT_COLLECTION) -> Dict:
+    """Bulk-load a snapshot into a freshly created collection without re-embedding."""
+    from qdrant_client.models import Distance, VectorParams
+    manifest = read_manifest(path)
+    if manifest["model"] != EMBEDDING_MODEL:
+        raise SystemExit(f"Snapshot was built with {manifest['model']}, but EMBEDDING_MODEL is {EMBEDDING_MODEL}.")
+    vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+    ids = _ids(path, len(vectors))
+
+    client.recreate_collection(
+        collection_name=collection,
+        vectors_config=VectorParams(size=manifest["dim"], distance=Distance(manifest["distance"])),
+    )
+    t0 = time.time()
+    client.upload_collection(
+        collection_name=collection,
+        vectors=vectors,
+        payload=_payloads(path, len(vectors)),
+        ids=ids,
+        batch_size=SNAPSHOT_UPLOAD_BATCH,
+        parallel=SNAPSHOT_UPLOAD_PARALLEL,
+        wait=True,
+    )
+    store_qdrant_manifest(client, manifest, collection)
+    print(f"[snapshot] Imported {len(vectors)} points into {collection} in {time.time()-t0:.1f}s")
+    return manifest
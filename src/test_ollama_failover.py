@@ -0,0 +1,100 @@
+"""Checks OllamaPool routing against two stub Ollama servers: ejection of a
+stopped or unhealthy backend, re-admission once it is back, and failover
+(OllamaUnavailable only when no backend can be reached).
+
+  python -m src.test_ollama_failover
+"""
+try:
+    from .ollama_client import OllamaPool, OllamaUnavailable
+    from .ollama_stub import StubOllama
+except ImportError:
+    from ollama_client import OllamaPool, OllamaUnavailable
+    from ollama_stub import StubOllama
+
+CALLS = 20
+
+def _setup():
+    a, b = StubOllama().start(), StubOllama().start()
+    # health_interval=0: checks run only when the test calls pool.check()
+    pool = OllamaPool([a.url, b.url], health_interval=0, eject_after=1, endpoint="chat")
+    pool.check()
+    return a, b, pool
+
+def _backend(pool, stub):
+    return next(x for x in pool.stats()["backends"] if x["url"] == stub.url)
+
+def _ask(pool, n=CALLS):
+    for _ in range(n):
+        assert pool.chat("question", "context"), "empty answer"
+
+def test_routing_uses_both():
+    """Both healthy backends get traffic"""
+    a, b, pool = _setup()
+    try:
+        _ask(pool)
+        assert a.requests and b.requests, f"requests a={a.requests} b={b.requests}"
+    finally:
+        pool.close(); a.stop(); b.stop()
+
+def test_failover_and_readmission():
+    """A stopped backend is skipped and ejected, and re-admitted once it is back"""
+    a, b, pool = _setup()
+    port = b.server.server_address[1]
+    try:
+        _ask(pool, 4)
+        b.stop()
+        before = a.requests
+        _ask(pool)  # every call still succeeds
+        assert a.requests - before == CALLS, f"{a.requests - before} of {CALLS} calls reached the live backend"
+        st = _backend(pool, b)
+        assert not st["healthy"] and st["ejections"] == 1, st
+
+        b = StubOllama(port=port).start()
+        pool.check()
+        assert _backend(pool, b)["healthy"], "not re-admitted"
+        _ask(pool)
+        assert b.requests, "re-admitted backend gets no traffic"
+    finally:
+        pool.close(); a.stop(); b.stop()
+
+def test_health_check_ejects():
+    """A backend without the model is ejected by the health check and gets no traffic"""
+    a, b, pool = _setup()
+    try:
+        b.models = []
+        pool.check()
+        assert not _backend(pool, b)["healthy"], "not ejected"
+        b.models = [pool.backends[0].client.model]
+        _ask(pool)
+        assert b.requests == 0, f"ejected backend got {b.requests} requests"
+    finally:
+        pool.close(); a.stop(); b.stop()
+
+def test_all_down():
+    """With every backend unreachable the call fails with OllamaUnavailable"""
+    a, b, pool = _setup()
+    a.stop(); b.stop()
+    try:
+        pool.chat("question", "context")
+    except OllamaUnavailable:
+        return
+    finally:
+        pool.close()
+    raise AssertionError("no OllamaUnavailable")
+
+def main():
+    tests = [test_routing_uses_both, test_failover_and_readmission, test_health_check_ejects, test_all_down]
+    failed = 0
+    for t in tests:
+        try:
+            t()
+            print(f"✓ {t.__doc__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"✗ {t.__doc__}: {e}")
+    if failed:
+        raise SystemExit(f"{failed} of {len(tests)} checks failed")
+    print("\nAll failover checks passed.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,423 @@
+"""Retrieval backends behind `Retriever.search`.
+
+Both stores take a normalized query vector and return `Hit`s ordered by
+descending cosine score:
+
+  QdrantStore  the Qdrant server at QDRANT_URL (default)
+  LocalStore   an in-process index directory built by `indexer_qdrant --backend local`
+
+Local index layout (LOCAL_INDEX_DIR):
+
+  vectors.npy     float32 [N, dim], L2-normalized, memory-mapped at startup
+  langs.npy       uint8 [N], index into meta["langs"]
+  payloads.jsonl  one JSON payload per row
+  offsets.npy     int64 [N+1] byte offsets into payloads.jsonl
+  hnsw.bin        optional hnswlib graph (inner product)
+  meta.json       model, dim, count, langs, hnsw
+
+`write_local_index` builds a new index in a sibling directory and swaps it in,
+so a running LocalStore keeps reading its memory-mapped files until it reopens.
+"""
+import os, json, mmap, time, uuid, shutil, asyncio, tempfile, threading
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+
+try:
+    from .config import (
+        QDRANT_URL, QDRANT_COLLECTION, VECTOR_BACKEND, LOCAL_INDEX_DIR, LOCAL_INDEX_HNSW,
+        LOCAL_HNSW_M, LOCAL_HNSW_EF_CONSTRUCTION, LOCAL_HNSW_EF, EMBEDDING_MODEL,
+        INDEX_VERSION_CHECK_SECONDS, SEARCH_HNSW_EF, SEARCH_EXACT, SEARCH_QUANT_RESCORE,
+        SEARCH_QUANT_OVERSAMPLING, SEARCH_SCORE_THRESHOLD, SEARCH_PAYLOAD_FIELDS
+    )
+except ImportError:
+    from config import (
+        QDRANT_URL, QDRANT_COLLECTION, VECTOR_BACKEND, LOCAL_INDEX_DIR, LOCAL_INDEX_HNSW,
+        LOCAL_HNSW_M, LOCAL_HNSW_EF_CONSTRUCTION, LOCAL_HNSW_EF, EMBEDDING_MODEL,
+        INDEX_VERSION_CHECK_SECONDS, SEARCH_HNSW_EF, SEARCH_EXACT, SEARCH_QUANT_RESCORE,
+        SEARCH_QUANT_OVERSAMPLING, SEARCH_SCORE_THRESHOLD, SEARCH_PAYLOAD_FIELDS
+    )
+
+class Hit:
+    __slots__ = ("id", "score", "payload")
+
+    def __init__(self, id, score: float, payload: Dict):
+        self.id = id
+        self.score = score
+        self.payload = payload
+
+# Payload fields the retriever and context builder always need
+REQUIRED_PAYLOAD = ("id", "url", "content", "content_hash", "lang")
+
+class SearchOptions:
+    """Per-request search tuning; unset fields fall back to the SEARCH_* config defaults."""
+    __slots__ = ("hnsw_ef", "exact", "quant_ignore", "quant_rescore", "quant_oversampling",
+                 "score_threshold", "payload_fields")
+
+    def __init__(self, hnsw_ef: Optional[int] = None, exact: Optional[bool] = None,
+                 quant_ignore: Optional[bool] = None, quant_rescore: Optional[bool] = None,
+                 quant_oversampling: Optional[float] = None, score_threshold: Optional[float] = None,
+                 payload_fields: Optional[List[str]] = None):
+        self.hnsw_ef = hnsw_ef if hnsw_ef is not None else (SEARCH_HNSW_EF or None)
+        self.exact = exact if exact is not None else SEARCH_EXACT
+        self.quant_ignore = quant_ignore
+        self.quant_rescore = (quant_rescore if quant_rescore is not None else
+                              {"true": True, "false": False}.get(SEARCH_QUANT_RESCORE.lower()))
+        self.quant_oversampling = quant_oversampling if quant_oversampling is not None else (SEARCH_QUANT_OVERSAMPLING or None)
+        self.score_threshold = score_threshold if score_threshold is not None else (SEARCH_SCORE_THRESHOLD or None)
+        self.payload_fields = payload_fields if payload_fields is not None else (SEARCH_PAYLOAD_FIELDS or None)
+
+    @classmethod
+    def from_dict(cls, d: Optional[Dict]) -> "SearchOptions":
+        return cls(**{k: v for k, v in (d or {}).items() if v is not None})
+
+    def as_dict(self) -> Dict:
+        return {k: getattr(self, k) for k in self.__slots__}
+
+    def qdrant_params(self):
+        from qdrant_client.models import SearchParams, QuantizationSearchParams
+        quant = None
+        if any(v is not None for v in (self.quant_ignore, self.quant_rescore, self.quant_oversampling)):
+            quant = QuantizationSearchParams(ignore=bool(self.quant_ignore), rescore=self.quant_rescore,
+                                             oversampling=self.quant_oversampling)
+        if self.hnsw_ef is None and not self.exact and quant is None:
+            return None
+        return SearchParams(hnsw_ef=self.hnsw_ef, exact=self.exact, quantization=quant)
+
+    def qdrant_payload(self):
+        if not self.payload_fields:
+            return True
+        return sorted(set(self.payload_fields) | set(REQUIRED_PAYLOAD))
+
+DEFAULT_SEARCH = SearchOptions()
+
+def meta_collection(collection: str = QDRANT_COLLECTION) -> str:
+    return f"{collection}-meta"
+
+def store_qdrant_manifest(client, manifest: Dict, collection: str = QDRANT_COLLECTION):
+    from qdrant_client.models import Distance, VectorParams, PointStruct
+    name = meta_collection(collection)
+    client.recreate_collection(collection_name=name, vectors_config=VectorParams(size=1, distance=Distance.DOT))
+    client.upsert(collection_name=name, points=[PointStruct(id=0, vector=[0.0], payload=manifest)])
+
+def load_qdrant_manifest(client, collection: str = QDRANT_COLLECTION) -> Optional[Dict]:
+    try:
+        pts = client.retrieve(collection_name=meta_collection(collection), ids=[0], with_payload=True)
+    except Exception:
+        return None
+    return pts[0].payload if pts else None
+
+class QdrantStore:
+    backend = "qdrant"
+
+    def __init__(self, url: str = QDRANT_URL, collection: str = QDRANT_COLLECTION, client=None):
+        # `client`: an existing QdrantClient (e.g. an in-memory one shared with the indexer);
+        # the async path still connects to `url`
+        from qdrant_client import QdrantClient
+        self.url = url
+        self.client = client if client is not None else QdrantClient(url)
+        self.collection = collection
+        self._aclient = None
+        self._version = None
+        self._version_checked = 0.0
+
+    @property
+    def aclient(self):
+        if self._aclient is None:
+            from qdrant_client import AsyncQdrantClient
+            self._aclient = AsyncQdrantClient(self.url)
+        return self._aclient
+
+    def index_version(self) -> Optional[str]:
+        """index_id of the last indexing run / snapshot import, re-read at most every few seconds."""
+        now = time.monotonic()
+        if now - self._version_checked >= INDEX_VERSION_CHECK_SECONDS:
+            manifest = load_qdrant_manifest(self.client, self.collection) or {}
+            self._version = manifest.get("index_id")
+            self._version_checked = now
+        return self._version
+
+    def stale(self, version: Optional[str]) -> bool:
+        return False  # searches go to the live collection
+
+    async def aindex_version(self) -> Optional[str]:
+        now = time.monotonic()
+        if now - self._version_checked >= INDEX_VERSION_CHECK_SECONDS:
+            self._version_checked = now
+            try:
+                pts = await self.aclient.retrieve(collection_name=meta_collection(self.collection),
+                                                  ids=[0], with_payload=True)
+                self._version = pts[0].payload.get("index_id") if pts else None
+            except Exception:
+                self._version = None
+        return self._version
+
+    def ping(self) -> bool:
+        try:
+            self.client.get_collection(self.collection)
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _filter(lang: Optional[str]):
+        from qdrant_client.models import Filter, FieldCondition, MatchValue
+        if not lang:
+            return None
+        return Filter(must=[FieldCondition(key="lang", match=MatchValue(value=lang))])
+
+    def _search_kwargs(self, qvec, lang: Optional[str], limit: int, opts: SearchOptions) -> Dict:
+        return dict(
+            collection_name=self.collection,
+            query=list(qvec),
+            query_filter=self._filter(lang),
+            limit=limit,
+            search_params=opts.qdrant_params(),
+            score_threshold=opts.score_threshold,
+            with_payload=opts.qdrant_payload(),
+        )
+
+    def search(self, qvec, lang: Optional[str] = None, limit: int = 10,
+               opts: SearchOptions = DEFAULT_SEARCH) -> List[Hit]:
+        res = self.client.query_points(**self._search_kwargs(qvec, lang, limit, opts))
+        return [Hit(h.id, h.score, h.payload) for h in res.points]
+
+    def search_batch(self, qvecs, lang: Optional[str] = None, limit: int = 10,
+                     opts: SearchOptions = DEFAULT_SEARCH) -> List[List[Hit]]:
+        from qdrant_client.models import QueryRequest
+        flt = self._filter(lang)
+        reqs = [QueryRequest(query=list(q), filter=flt, limit=limit, params=opts.qdrant_params(),
+                             score_threshold=opts.score_threshold, with_payload=opts.qdrant_payload())
+                for q in qvecs]
+        if not reqs:
+            return []
+        res = self.client.query_batch_points(collection_name=self.collection, requests=reqs)
+        return [[Hit(h.id, h.score, h.payload) for h in r.points] for r in res]
+
+    async def asearch(self, qvec, lang: Optional[str] = None, limit: int = 10,
+                      opts: SearchOptions = DEFAULT_SEARCH) -> List[Hit]:
+        res = await self.aclient.query_points(**self._search_kwargs(qvec, lang, limit, opts))
+        return [Hit(h.id, h.score, h.payload) for h in res.points]
+
+class LocalStore:
+    backend = "local"
+
+    def __init__(self, path: str = LOCAL_INDEX_DIR, use_hnsw: bool = LOCAL_INDEX_HNSW):
+        if not os.path.exists(os.path.join(path, "meta.json")):
+            raise FileNotFoundError(f"Missing local index: {path}. Run `python -m src.indexer_qdrant --backend local` first.")
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta["model"] != EMBEDDING_MODEL:
+            raise ValueError(f"Local index {path} was built with {self.meta['model']}, not {EMBEDDING_MODEL}.")
+        self.path = path
+        self.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        self.langs = np.load(os.path.join(path, "langs.npy"), mmap_mode="r")
+        self.offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")
+        self._pf = open(os.path.join(path, "payloads.jsonl"), "rb")
+        self._payloads = mmap.mmap(self._pf.fileno(), 0, access=mmap.ACCESS_READ) if self.offsets[-1] else b""
+        self._lang_codes = {l: i for i, l in enumerate(self.meta["langs"])}
+        self._lang_masks: Dict[int, np.ndarray] = {}
+
+        self.hnsw = None
+        hnsw_path = os.path.join(path, "hnsw.bin")
+        if use_hnsw and os.path.exists(hnsw_path):
+            import hnswlib
+            self.hnsw = hnswlib.Index(space="ip", dim=self.meta["dim"])
+            self.hnsw.load_index(hnsw_path, max_elements=self.meta["count"])
+            self.hnsw.set_ef(LOCAL_HNSW_EF)
+        self._ef_lock = threading.Lock()  # ef is index-wide state in hnswlib
+
+        self._version = None
+        self._version_checked = 0.0
+        self.loaded_version = self._read_version()  # index_id of the files opened above
+
+    def __len__(self):
+        return self.meta["count"]
+
+    def _read_version(self) -> Optional[str]:
+        try:
+            with open(os.path.join(self.path, "manifest.json"), "r", encoding="utf-8") as f:
+                return json.load(f).get("index_id")
+        except (OSError, ValueError):
+            return None
+
+    def stale(self, version: Optional[str]) -> bool:
+        """Whether `version` (from index_version) names a different index than the one opened."""
+        return version is not None and version != self.loaded_version
+
+    def index_version(self) -> Optional[str]:
+        now = time.monotonic()
+        if now - self._version_checked >= INDEX_VERSION_CHECK_SECONDS:
+            self._version = self._read_version()
+            self._version_checked = now
+        return self._version
+
+    async def aindex_version(self) -> Optional[str]:
+        return self.index_version()
+
+    def ping(self) -> bool:
+        return True
+
+    def payload(self, i: int) -> Dict:
+        return json.loads(self._payloads[self.offsets[i]:self.offsets[i + 1]])
+
+    def _mask(self, code: int) -> np.ndarray:
+        m = self._lang_masks.get(code)
+        if m is None:
+            m = self._lang_masks[code] = np.asarray(self.langs) != code
+        return m
+
+    def _hits(self, ids, scores, opts: SearchOptions) -> List[Hit]:
+        thr, fields = opts.score_threshold, opts.payload_fields
+        out = []
+        for i, s in zip(ids, scores):
+            s = float(s)
+            if not np.isfinite(s) or (thr is not None and s < thr):
+                continue
+            p = self.payload(int(i))
+            if fields:
+                keep = set(fields) | set(REQUIRED_PAYLOAD)
+                p = {k: v for k, v in p.items() if k in keep}
+            out.append(Hit(int(i), s, p))
+        return out
+
+    def search(self, qvec, lang: Optional[str] = None, limit: int = 10,
+               opts: SearchOptions = DEFAULT_SEARCH) -> List[Hit]:
+        n = len(self)
+        if n == 0 or limit <= 0:
+            return []
+        code = None
+        if lang:
+            code = self._lang_codes.get(lang)
+            if code is None:
+                return []
+        q = np.asarray(qvec, dtype=np.float32)
+
+        if self.hnsw is not None and not opts.exact:
+            flt = None if code is None else (lambda i: self.langs[i] == code)
+            k = min(limit, n)
+            try:
+                with self._ef_lock:
+                    if opts.hnsw_ef:
+                        self.hnsw.set_ef(max(opts.hnsw_ef, k))
+                    try:
+                        labels, dists = self.hnsw.knn_query(q, k=k, filter=flt)
+                    finally:
+                        if opts.hnsw_ef:
+                            self.hnsw.set_ef(LOCAL_HNSW_EF)
+            except RuntimeError:  # fewer than k matches for a selective filter
+                return self._exact(q, code, limit, opts)
+            # hnswlib "ip" distance is 1 - dot
+            return self._hits(labels[0], 1.0 - dists[0], opts)
+        return self._exact(q, code, limit, opts)
+
+    def search_batch(self, qvecs, lang: Optional[str] = None, limit: int = 10,
+                     opts: SearchOptions = DEFAULT_SEARCH) -> List[List[Hit]]:
+        if (self.hnsw is not None and not opts.exact) or not len(qvecs) or not len(self) or limit <= 0:
+            return [self.search(q, lang=lang, limit=limit, opts=opts) for q in qvecs]
+        code = None
+        if lang:
+            code = self._lang_codes.get(lang)
+            if code is None:
+                return [[] for _ in qvecs]
+        # One matrix product for all queries
+        scores = self.vectors @ np.asarray(qvecs, dtype=np.float32).T
+        if code is not None:
+            scores[self._mask(code)] = -np.inf
+        k = min(limit, len(self))
+        out = []
+        for col in scores.T:
+            top = np.argpartition(-col, k - 1)[:k]
+            top = top[np.argsort(-col[top])]
+            out.append(self._hits(top, col[top], opts))
+        return out
+
+    async def asearch(self, qvec, lang: Optional[str] = None, limit: int = 10,
+                      opts: SearchOptions = DEFAULT_SEARCH) -> List[Hit]:
+        # In-process, but a full scan of a large matrix should not stall the event loop
+        return await asyncio.to_thread(self.search, qvec, lang, limit, opts)
+
+    def _exact(self, q: np.ndarray, code: Optional[int], limit: int,
+               opts: SearchOptions = DEFAULT_SEARCH) -> List[Hit]:
+        scores = self.vectors @ q
+        if code is not None:
+            scores = np.where(self._mask(code), -np.inf, scores)
+        k = min(limit, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return self._hits(top, scores[top], opts)
+
+def write_local_index(path: str, vectors: np.ndarray, payloads: Iterable[Dict],
+                      model: str = EMBEDDING_MODEL, hnsw: bool = LOCAL_INDEX_HNSW,
+                      manifest: Optional[Dict] = None) -> dict:
+    """Writes the index (and `manifest`, if given) to a temp directory next to `path`, then swaps it in."""
+    path = os.path.abspath(path)
+    parent = os.path.dirname(path)
+    os.makedirs(parent, exist_ok=True)
+    tmp = tempfile.mkdtemp(prefix=os.path.basename(path) + ".tmp-", dir=parent)
+    try:
+        meta = _write_index_files(tmp, vectors, payloads, model, hnsw, _previous_langs(path))
+        if manifest is not None:
+            with open(os.path.join(tmp, "manifest.json"), "w", encoding="utf-8") as f:
+                json.dump(manifest, f, indent=2)
+        old = None
+        if os.path.exists(path):
+            # Files of the old index stay valid for whoever has them mapped; they go away with the last mapping
+            old = f"{path}.old-{uuid.uuid4().hex[:8]}"
+            os.replace(path, old)
+        os.replace(tmp, path)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    if old:
+        shutil.rmtree(old, ignore_errors=True)
+    return meta
+
+def _previous_langs(path: str) -> List[str]:
+    try:
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            return list(json.load(f).get("langs", []))
+    except (OSError, ValueError):
+        return []
+
+def _write_index_files(path: str, vectors: np.ndarray, payloads: Iterable[Dict], model: str,
+                       hnsw: bool, langs_before: List[str]) -> dict:
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    # Languages keep the codes the previous index gave them; new ones are appended
+    langs, codes, offsets = [], {l: i for i, l in enumerate(langs_before)}, [0]
+    with open(os.path.join(path, "payloads.jsonl"), "wb") as f:
+        for p in payloads:
+            lang = p.get("lang") or ""
+            langs.append(codes.setdefault(lang, len(codes)))
+            line = (json.dumps(p, ensure_ascii=False) + "\n").encode("utf-8")
+            f.write(line)
+            offsets.append(offsets[-1] + len(line))
+    if len(langs) != len(vectors):
+        raise ValueError(f"{len(vectors)} vectors but {len(langs)} payloads")
+    np.save(os.path.join(path, "vectors.npy"), vectors)
+    np.save(os.path.join(path, "langs.npy"), np.asarray(langs, dtype=np.uint8))
+    np.save(os.path.join(path, "offsets.npy"), np.asarray(offsets, dtype=np.int64))
+
+    if hnsw and len(vectors):
+        import hnswlib
+        index = hnswlib.Index(space="ip", dim=vectors.shape[1])
+        index.init_index(max_elements=len(vectors), M=LOCAL_HNSW_M, ef_construction=LOCAL_HNSW_EF_CONSTRUCTION)
+        index.add_items(vectors, np.arange(len(vectors)))
+        index.save_index(os.path.join(path, "hnsw.bin"))
+
+    meta = {
+        "model": model,
+        "dim": int(vectors.shape[1]) if vectors.ndim == 2 else 0,
+        "count": len(vectors),
+        "langs": list(codes),
+        "hnsw": bool(hnsw and len(vectors)),
+    }
+    with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+def load_store(backend: str = VECTOR_BACKEND):
+    if backend == "local":
+        return LocalStore()
+    if backend == "qdrant":
+        return QdrantStore()
+    raise ValueError(f"Unknown VECTOR_BACKEND: {backend}")